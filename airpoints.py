@@ -1,8 +1,15 @@
 import discord
 from discord import app_commands
-from datetime import datetime
+from discord.ext import tasks
+import bisect
+import sqlite3
+import time
 
-from database import kc, krispoints_db, krispoints_lock
+from async_db import fetchall, transaction
+from database import register_query
+from dm_outbox import OUTBOX_INSERT, dm_row, notify_outbox
+from embeds import Field, Template, ListPager
+from users import resolve_users
 
 
 STAFF_ROLES_IDS = {1468230337900580887}
@@ -18,6 +25,351 @@ def is_bot_commands_channel(interaction: discord.Interaction):
     return interaction.channel_id == BOT_COMMANDS_CHANNEL
 
 
+async def send_error(interaction: discord.Interaction, text):
+    # the first followup after a public defer replaces the thinking message
+    # and stays public whatever its flags, so that message goes first
+    if interaction.response.is_done():
+        await interaction.delete_original_response()
+        await interaction.followup.send(text, ephemeral=True)
+    else:
+        await interaction.response.send_message(text, ephemeral=True)
+
+
+# every change is appended to krispoints_ledger in the same savepoint as
+# the balance update; krispoints is the snapshot the ledger folds into,
+# so a balance read is still one row
+AWARDED = Template(
+    title="✅ Airpoints Awarded",
+    color=discord.Color.green(),
+    fields=[
+        Field("User", "{user}"),
+        Field("Points Awarded", "**+{amount}**", inline=True),
+        Field("New Balance", "**{balance:,}**", inline=True),
+        Field("Flight", "{flight}"),
+        Field("Total Flights", "**{flights}**", inline=True),
+    ],
+    timestamp=True,
+)
+
+FLIGHT_AWARDED = Template(
+    title="✅ Flight Airpoints Awarded",
+    color=discord.Color.green(),
+    fields=[
+        Field("Flight", "{flight}"),
+        Field("Passengers", "**{passengers}**", inline=True),
+        Field("Points Each", "**+{amount}**", inline=True),
+        Field("Total Awarded", "**{total:,}**", inline=True),
+    ],
+    timestamp=True,
+)
+
+FLIGHT_AWARD_DM = Template(
+    title="✈️ Airpoints Earned",
+    color=discord.Color.green(),
+    fields=[
+        Field("Flight", "{flight}"),
+        Field("Points Awarded", "**+{amount}**", inline=True),
+        Field("New Balance", "**{balance:,}**", inline=True),
+    ],
+    footer="Thank you for flying Air New Zealand!",
+)
+
+BALANCE = Template(
+    title="💳 Airpoints Balance",
+    color=discord.Color.blue(),
+    fields=[
+        Field("User", "{user}"),
+        Field("Balance", "**{balance:,}** Airpoints"),
+        Field("Flights Completed", "**{flights}**"),
+        Field("Rank", "**#{rank}** of {members}", optional=True),
+    ],
+    timestamp=True,
+)
+
+DEDUCTED = Template(
+    title="❌ Airpoints Deducted",
+    color=discord.Color.red(),
+    fields=[
+        Field("User", "{user}"),
+        Field("Points Deducted", "**-{amount}**", inline=True),
+        Field("New Balance", "**{balance:,}**", inline=True),
+        Field("Reason", "{reason}"),
+    ],
+    timestamp=True,
+)
+
+LEADERBOARD_PAGE = Template(
+    title="🏆 Airpoints Leaderboard",
+    description="{lines}",
+    color=discord.Color.gold(),
+    footer="Page {page} of {pages} • {members} members",
+    timestamp=True,
+)
+
+RESET = Template(
+    title="🔄 Airpoints Reset",
+    color=discord.Color.orange(),
+    fields=[
+        Field("User", "{user}"),
+        Field("Balance", "**0**", inline=True),
+        Field("Flights", "**0**", inline=True),
+    ],
+    timestamp=True,
+)
+
+LEDGER_COMPACT_DAYS = 365   # older entries fold into one snapshot row per user
+FLIGHT_ARCHIVE_WINDOW = 86400   # departures archived this recently can still be awarded
+HISTORY_PAGE_SIZE = 10
+
+SELECT_BALANCES = register_query("SELECT user_id, balance, flights FROM krispoints WHERE user_id IN ({marks})")
+# the leaderboard is loaded whole on startup
+LOAD_BALANCES = register_query("SELECT user_id, balance, flights FROM krispoints", "krispoints")
+AWARD = register_query("""
+    INSERT INTO krispoints (user_id, balance, flights) VALUES (?, ?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET balance = balance + excluded.balance, flights = flights + 1
+""")
+AWARD_RETURNING = register_query(AWARD + "RETURNING balance, flights")
+DEDUCT = register_query("UPDATE krispoints SET balance = MAX(0, balance - ?) WHERE user_id=? RETURNING balance, flights")
+RESET_BALANCE = register_query("""
+    INSERT INTO krispoints (user_id, balance, flights) VALUES (?, 0, 0)
+    ON CONFLICT(user_id) DO UPDATE SET balance = 0, flights = 0
+""")
+LEDGER_AWARD = register_query(
+    "INSERT INTO krispoints_ledger (user_id, kind, delta, balance, flights, flight, staff_id, created_at) "
+    "VALUES (?, 'award', ?, ?, ?, ?, ?, ?)"
+)
+LEDGER_DEDUCT = register_query(
+    "INSERT INTO krispoints_ledger (user_id, kind, delta, balance, flights, reason, staff_id, created_at) "
+    "SELECT user_id, 'deduct', -MIN(?, balance), MAX(0, balance - ?), flights, ?, ?, ? "
+    "FROM krispoints WHERE user_id=?"
+)
+LEDGER_RESET = register_query(
+    "INSERT INTO krispoints_ledger (user_id, kind, delta, balance, flights, staff_id, created_at) "
+    "VALUES (?, 'reset', -COALESCE((SELECT balance FROM krispoints WHERE user_id=?), 0), 0, 0, ?, ?)"
+)
+LEDGER_SNAPSHOT = register_query(
+    "INSERT INTO krispoints_ledger (id, user_id, kind, delta, balance, flights, reason, created_at) "
+    "VALUES (?, ?, 'snapshot', ?, ?, ?, ?, ?)"
+)
+LEDGER_ENTRY = register_query("SELECT balance, flights, created_at FROM krispoints_ledger WHERE id=?")
+# ranges the partial idx_ledger_unfolded, which only holds entries not yet
+# folded into a snapshot, so each run reads what aged since the last one
+LEDGER_UNFOLDED = register_query(
+    "SELECT user_id FROM krispoints_ledger WHERE kind != 'snapshot' AND created_at < ?"
+)
+LEDGER_GROUP = register_query(
+    "SELECT MAX(id), SUM(delta), COUNT(*) FROM krispoints_ledger WHERE user_id=? AND created_at < ?"
+)
+LEDGER_FOLD = register_query("DELETE FROM krispoints_ledger WHERE user_id=? AND id <= ?")
+HISTORY_FIRST = register_query(
+    "SELECT id, kind, delta, balance, flight, reason, created_at FROM krispoints_ledger "
+    "WHERE user_id=? ORDER BY id DESC LIMIT ?"
+)
+HISTORY_BEFORE = register_query(
+    "SELECT id, kind, delta, balance, flight, reason, created_at FROM krispoints_ledger "
+    "WHERE user_id=? AND id < ? ORDER BY id DESC LIMIT ?"
+)
+LIVE_DEPARTURE = register_query("SELECT departure_epoch FROM flights WHERE flight_code=?")
+LAST_ARCHIVED_DEPARTURE = register_query(
+    "SELECT MAX(departure_epoch) FROM bookings_archive WHERE flight=? AND archived_at >= ?"
+)
+LIVE_PASSENGERS = register_query("SELECT discord_id FROM bookings WHERE flight=?")
+ARCHIVED_PASSENGERS = register_query(
+    "SELECT discord_id FROM bookings_archive WHERE flight=? AND departure_epoch=?"
+)
+RECORD_FLIGHT_AWARD = register_query(
+    "INSERT INTO flight_awards (flight, departure_epoch, amount, staff_id, awarded_at) VALUES (?, ?, ?, ?, ?)"
+)
+
+
+class Leaderboard:
+    # every member's (-balance, user_id) kept sorted, so a member's rank is
+    # their index + 1 and a page is a slice; loaded once, then kept in step
+    # by the write paths instead of sorting krispoints on each call
+    def __init__(self):
+        self.keys = []
+        self.entries = {}   # user_id -> (balance, flights)
+
+    def load(self, rows):
+        self.entries = {user_id: (balance, flights) for user_id, balance, flights in rows}
+        self.keys = sorted((-balance, user_id) for user_id, (balance, _) in self.entries.items())
+
+    def update(self, user_id, balance, flights=None):
+        old = self.entries.get(user_id)
+        if flights is None:
+            flights = old[1] if old else 0
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old[0], user_id))]
+        bisect.insort(self.keys, (-balance, user_id))
+        self.entries[user_id] = (balance, flights)
+
+    def rank(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self.keys, (-entry[0], user_id)) + 1
+
+    def page(self, start, count):
+        return [(user_id, *self.entries[user_id]) for _, user_id in self.keys[start:start + count]]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+LEADERBOARD = Leaderboard()
+LEADERBOARD_PAGE_SIZE = 10
+
+
+# /airpoints reads LEADERBOARD.entries, which holds every member with a record
+BALANCE_STATS = {"hits": 0, "misses": 0}
+
+
+def record_balance(user_id, balance, flights):
+    # called after each committed write
+    LEADERBOARD.update(user_id, balance, flights)
+
+
+def get_balance(user_id):
+    # (balance, flights), or None for no record
+    row = LEADERBOARD.entries.get(user_id)
+    BALANCE_STATS["hits" if row is not None else "misses"] += 1
+    return row
+
+
+def balance_stats():
+    return dict(BALANCE_STATS, members=len(LEADERBOARD))
+
+
+async def load_leaderboard():
+    LEADERBOARD.load(await fetchall(LOAD_BALANCES))
+    print(f"[AIRPOINTS] Leaderboard loaded ({len(LEADERBOARD)} members)")
+
+
+def _award(cur, user_id, amount, flight=None, staff_id=None):
+    cur.execute(AWARD_RETURNING, (user_id, amount))
+    balance, flights = cur.fetchone()
+    cur.execute(
+        LEDGER_AWARD,
+        (user_id, amount, balance, flights, flight, staff_id, time.time())
+    )
+    return balance, flights
+
+
+def _deduct(cur, user_id, amount, reason=None, staff_id=None):
+    # the ledger records what was actually taken once clamped at zero;
+    # no row means no record, so this stays an UPDATE rather than an upsert
+    cur.execute(
+        LEDGER_DEDUCT,
+        (amount, amount, reason, staff_id, time.time(), user_id)
+    )
+    cur.execute(DEDUCT, (amount, user_id))
+    return cur.fetchone()
+
+
+def _reset(cur, user_id, staff_id=None):
+    cur.execute(LEDGER_RESET, (user_id, user_id, staff_id, time.time()))
+    cur.execute(RESET_BALANCE, (user_id,))
+
+
+class AwardRefused(Exception):
+    pass
+
+
+def _award_flight(cur, flight, amount, staff_id, now):
+    # every passenger of one departure of the flight; one upsert batch, one
+    # ledger batch and one outbox batch, all committed together
+    row = cur.execute(LIVE_DEPARTURE, (flight,)).fetchone()
+    live = row[0] if row else None
+    archived = cur.execute(LAST_ARCHIVED_DEPARTURE, (flight, now - FLIGHT_ARCHIVE_WINDOW)).fetchone()[0]
+
+    # the scheduled flight, unless it is still to come and the code's last
+    # departure was archived recently, i.e. the one that has just flown
+    if row and (live is None or live <= now or archived is None):
+        if live is None:
+            raise AwardRefused(f"{flight} has no valid departure time")
+        departure = live
+        cur.execute(LIVE_PASSENGERS, (flight,))
+    elif archived is not None:
+        departure = archived
+        cur.execute(ARCHIVED_PASSENGERS, (flight, departure))
+    else:
+        return []
+
+    user_ids = sorted({int(row[0]) for row in cur if row[0] and row[0].isdigit()})
+    if not user_ids:
+        return []
+
+    try:
+        cur.execute(RECORD_FLIGHT_AWARD, (flight, departure, amount, staff_id, now))
+    except sqlite3.IntegrityError:
+        raise AwardRefused(f"{flight} departing <t:{departure}:f> has already been awarded")
+
+    cur.executemany(
+        AWARD,
+        [(user_id, amount) for user_id in user_ids]
+    )
+
+    results = []
+    for i in range(0, len(user_ids), 500):
+        chunk = user_ids[i:i + 500]
+        cur.execute(SELECT_BALANCES.format(marks=",".join("?" * len(chunk))), chunk)
+        results.extend(cur.fetchall())
+
+    cur.executemany(
+        LEDGER_AWARD,
+        [(user_id, amount, balance, flights, flight, staff_id, now) for user_id, balance, flights in results]
+    )
+
+    cur.executemany(OUTBOX_INSERT, [
+        dm_row(user_id, embed=FLIGHT_AWARD_DM.render(flight=flight, amount=amount, balance=balance))
+        for user_id, balance, flights in results
+    ])
+    return results
+
+
+def _compact_ledger(cur, cutoff):
+    # folds each user's entries before the cutoff into one snapshot row that
+    # keeps the id of the last folded entry, so history order is unchanged
+    # and the deltas still sum to the balance
+    compacted = 0
+    users = {user_id for (user_id,) in cur.execute(LEDGER_UNFOLDED, (cutoff,))}
+    for user_id in users:
+        last_id, delta, count = cur.execute(LEDGER_GROUP, (user_id, cutoff)).fetchone()
+        if count < 2:
+            continue
+        balance, flights, created_at = cur.execute(LEDGER_ENTRY, (last_id,)).fetchone()
+        cur.execute(LEDGER_FOLD, (user_id, last_id))
+        cur.execute(
+            LEDGER_SNAPSHOT,
+            (last_id, user_id, delta, balance, flights, f"{count} entries compacted", created_at)
+        )
+        compacted += 1
+    return compacted
+
+
+@tasks.loop(hours=24)
+async def compact_ledger_task():
+    try:
+        cutoff = time.time() - LEDGER_COMPACT_DAYS * 86400
+        compacted = await transaction(_compact_ledger, cutoff)
+        if compacted:
+            print(f"[AIRPOINTS] Compacted ledger history for {compacted} users")
+    except Exception as e:
+        print(f"[AIRPOINTS / COMPACT] {e}")
+
+
+def start_ledger_compaction():
+    if not compact_ledger_task.is_running():
+        compact_ledger_task.start()
+
+
+def history_line(row):
+    entry_id, kind, delta, balance, flight, reason, created_at = row
+    detail = flight or reason
+    detail = f" • {detail}" if detail else ""
+    return f"<t:{int(created_at)}:d> **{delta:+,}** {kind}{detail} → {balance:,}"
+
+
 def register_airpoints_commands(bot):
 
     @bot.tree.command(name="awardairpoints", description="Award Airpoints (Staff)")
@@ -29,35 +381,12 @@ def register_airpoints_commands(bot):
             )
 
         try:
-            with krispoints_lock:
-                kc.execute(
-                    "SELECT balance, flights FROM krispoints WHERE user_id=?",
-                    (user.id,)
-                )
-                row = kc.fetchone()
-
-                current_balance = row[0] if row else 0
-                current_flights = row[1] if row else 0
-
-                new_balance = current_balance + amount
-                new_flights = current_flights + 1
+            new_balance, new_flights = await transaction(_award, user.id, amount, flight, interaction.user.id)
+            record_balance(user.id, new_balance, new_flights)
 
-                kc.execute(
-                    "REPLACE INTO krispoints VALUES (?,?,?)",
-                    (user.id, new_balance, new_flights)
-                )
-                krispoints_db.commit()
-
-            embed = discord.Embed(
-                title="✅ Airpoints Awarded",
-                color=discord.Color.green(),
-                timestamp=datetime.now()
+            embed = AWARDED.render(
+                user=user.mention, amount=amount, balance=new_balance, flight=flight, flights=new_flights
             )
-            embed.add_field(name="User", value=user.mention, inline=False)
-            embed.add_field(name="Points Awarded", value=f"**+{amount}**", inline=True)
-            embed.add_field(name="New Balance", value=f"**{new_balance:,}**", inline=True)
-            embed.add_field(name="Flight", value=flight, inline=False)
-            embed.add_field(name="Total Flights", value=f"**{new_flights}**", inline=True)
 
             await interaction.response.send_message(embed=embed)
             print(f"[AIRPOINTS] +{amount} → {user} (now {new_balance})")
@@ -71,16 +400,50 @@ def register_airpoints_commands(bot):
         await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
 
 
+    @bot.tree.command(name="awardflight", description="Award Airpoints to every passenger on a flight (Staff)")
+    @app_commands.check(staff)
+    async def award_flight(interaction: discord.Interaction, flight: str, amount: int):
+        if amount <= 0:
+            return await interaction.response.send_message(
+                "❌ Amount must be positive", ephemeral=True
+            )
+
+        await interaction.response.defer()
+
+        try:
+            results = await transaction(_award_flight, flight, amount, interaction.user.id, time.time())
+
+            if not results:
+                return await send_error(interaction, f"❌ No passengers found for {flight}")
+
+            for user_id, balance, flights in results:
+                record_balance(user_id, balance, flights)
+            notify_outbox()
+
+            embed = FLIGHT_AWARDED.render(
+                flight=flight, passengers=len(results), amount=amount, total=amount * len(results)
+            )
+
+            await interaction.followup.send(embed=embed)
+            print(f"[AIRPOINTS] +{amount} → {len(results)} passengers of {flight}")
+
+        except AwardRefused as e:
+            await send_error(interaction, f"❌ {e}")
+        except Exception as e:
+            print(f"[AIRPOINTS / AWARD FLIGHT] {e}")
+            await send_error(interaction, "❌ Error")
+
+    @award_flight.error
+    async def award_flight_error(interaction: discord.Interaction, error):
+        await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
+
+
     @bot.tree.command(name="airpoints", description="Check Airpoints balance")
     async def airpoints_cmd(interaction: discord.Interaction, user: discord.Member = None):
         target = user or interaction.user
 
         try:
-            kc.execute(
-                "SELECT balance, flights FROM krispoints WHERE user_id=?",
-                (target.id,)
-            )
-            row = kc.fetchone()
+            row = get_balance(target.id)
 
             if not row:
                 return await interaction.response.send_message(
@@ -88,14 +451,10 @@ def register_airpoints_commands(bot):
                     ephemeral=True
                 )
 
-            embed = discord.Embed(
-                title="💳 Airpoints Balance",
-                color=discord.Color.blue(),
-                timestamp=datetime.now()
+            embed = BALANCE.render(
+                user=target.mention, balance=row[0], flights=row[1],
+                rank=LEADERBOARD.rank(target.id), members=len(LEADERBOARD)
             )
-            embed.add_field(name="User", value=target.mention, inline=False)
-            embed.add_field(name="Balance", value=f"**{row[0]:,}** Airpoints", inline=False)
-            embed.add_field(name="Flights Completed", value=f"**{row[1]}**", inline=False)
 
             await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -114,36 +473,18 @@ def register_airpoints_commands(bot):
             )
 
         try:
-            with krispoints_lock:
-                kc.execute(
-                    "SELECT balance, flights FROM krispoints WHERE user_id=?",
-                    (user.id,)
-                )
-                row = kc.fetchone()
-
-                if not row:
-                    return await interaction.response.send_message(
-                        f"❌ No record for {user.mention}",
-                        ephemeral=True
-                    )
-
-                new_balance = max(0, row[0] - amount)
+            row = await transaction(_deduct, user.id, amount, reason, interaction.user.id)
 
-                kc.execute(
-                    "REPLACE INTO krispoints VALUES (?,?,?)",
-                    (user.id, new_balance, row[1])
+            if row is None:
+                return await interaction.response.send_message(
+                    f"❌ No record for {user.mention}",
+                    ephemeral=True
                 )
-                krispoints_db.commit()
 
-            embed = discord.Embed(
-                title="❌ Airpoints Deducted",
-                color=discord.Color.red(),
-                timestamp=datetime.now()
-            )
-            embed.add_field(name="User", value=user.mention, inline=False)
-            embed.add_field(name="Points Deducted", value=f"**-{amount}**", inline=True)
-            embed.add_field(name="New Balance", value=f"**{new_balance:,}**", inline=True)
-            embed.add_field(name="Reason", value=reason, inline=False)
+            new_balance, new_flights = row
+            record_balance(user.id, new_balance, new_flights)
+
+            embed = DEDUCTED.render(user=user.mention, amount=amount, balance=new_balance, reason=reason)
 
             await interaction.response.send_message(embed=embed)
             print(f"[AIRPOINTS] -{amount} → {user} (now {new_balance})")
@@ -157,41 +498,42 @@ def register_airpoints_commands(bot):
         await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
 
 
-    @bot.tree.command(name="airpoints_leaderboard", description="Top 10 Airpoints")
-    async def leaderboard(interaction: discord.Interaction):
+    @bot.tree.command(name="airpoints_leaderboard", description="Airpoints leaderboard")
+    async def leaderboard(interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
         try:
-            kc.execute(
-                "SELECT user_id, balance, flights FROM krispoints ORDER BY balance DESC LIMIT 10"
-            )
-            rows = kc.fetchall()
+            start = (page - 1) * LEADERBOARD_PAGE_SIZE
+            rows = LEADERBOARD.page(start, LEADERBOARD_PAGE_SIZE)
 
             if not rows:
                 return await interaction.response.send_message(
                     "📊 No records", ephemeral=True
                 )
 
-            embed = discord.Embed(
-                title="🏆 Airpoints Leaderboard",
-                color=discord.Color.gold(),
-                timestamp=datetime.now()
-            )
+            # a page of uncached members can outlast the 3 s reply window
+            await interaction.response.defer()
 
             medals = ["🥇", "🥈", "🥉"]
             lines = []
 
-            for i, (uid, bal, fl) in enumerate(rows, start=1):
+            # the whole page's names in one lookup instead of one at a time
+            users = await resolve_users(bot, [row[0] for row in rows])
+
+            for i, (uid, bal, fl) in enumerate(rows, start=start + 1):
                 prefix = medals[i - 1] if i <= 3 else f"**{i}.**"
-                user = bot.get_user(uid)
+                user = users.get(uid)
                 name = user.name if user else f"User {uid}"
 
                 lines.append(f"{prefix} {name} — **{bal:,}** pts ({fl} flights)")
 
-            embed.description = "\n".join(lines)
-            await interaction.response.send_message(embed=embed)
+            embed = LEADERBOARD_PAGE.render(
+                lines="\n".join(lines), page=page,
+                pages=-(-len(LEADERBOARD) // LEADERBOARD_PAGE_SIZE), members=len(LEADERBOARD)
+            )
+            await interaction.followup.send(embed=embed)
 
         except Exception as e:
             print(f"[AIRPOINTS / LEADERBOARD] {e}")
-            await interaction.response.send_message("❌ Error", ephemeral=True)
+            await send_error(interaction, "❌ Error")
 
 
     @bot.tree.command(name="resetairpoints", description="Reset airpoints (Staff)")
@@ -199,23 +541,10 @@ def register_airpoints_commands(bot):
     @app_commands.check(is_bot_commands_channel)
     async def reset_krispoints(interaction: discord.Interaction, user: discord.Member):
         try:
-            with krispoints_lock:
-                kc.execute(
-                    "REPLACE INTO krispoints VALUES (?,?,?)",
-                    (user.id, 0, 0)
-                )
-                krispoints_db.commit()
-
-            embed = discord.Embed(
-                title="🔄 Airpoints Reset",
-                color=discord.Color.orange(),
-                timestamp=datetime.now()
-            )
-            embed.add_field(name="User", value=user.mention, inline=False)
-            embed.add_field(name="Balance", value="**0**", inline=True)
-            embed.add_field(name="Flights", value="**0**", inline=True)
+            await transaction(_reset, user.id, interaction.user.id)
+            record_balance(user.id, 0, 0)
 
-            await interaction.response.send_message(embed=embed)
+            await interaction.response.send_message(embed=RESET.render(user=user.mention))
 
         except Exception as e:
             print(f"[AIRPOINTS / RESET] {e}")
@@ -224,3 +553,27 @@ def register_airpoints_commands(bot):
     @reset_krispoints.error
     async def reset_error(interaction: discord.Interaction, error):
         await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
+
+
+    @bot.tree.command(name="airpoints_history", description="Airpoints history")
+    async def airpoints_history(interaction: discord.Interaction, user: discord.Member = None):
+        target = user or interaction.user
+
+        async def fetch(before):
+            # keyset pages over the ledger, newest first
+            if before is None:
+                return await fetchall(HISTORY_FIRST, (target.id, HISTORY_PAGE_SIZE + 1))
+            return await fetchall(HISTORY_BEFORE, (target.id, before, HISTORY_PAGE_SIZE + 1))
+
+        try:
+            pager = ListPager(
+                interaction.user.id, "📜 Airpoints History", f"{target.mention}\n\n",
+                fetch, history_line, HISTORY_PAGE_SIZE, "No history",
+                first=None, labels=("◀ Newer", "Older ▶")
+            )
+            await pager.load()
+            await interaction.response.send_message(embed=pager.embed(), view=pager, ephemeral=True)
+
+        except Exception as e:
+            print(f"[AIRPOINTS / HISTORY] {e}")
+            await interaction.response.send_message("❌ Error", ephemeral=True)
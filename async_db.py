@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from discord.ext import tasks
+
+import database
+
+# reads fan out over a few threads; writes go through the group-commit
+# batcher's thread, the maintenance executor only runs setup and checkpoints
+read_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-read")
+write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-maint")
+
+
+def _run_read(fn, args):
+    with database.POOL.read() as cur:
+        return fn(cur, *args)
+
+
+async def query(fn, *args):
+    # fn(cursor, *args) runs on the read pool
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(read_executor, _run_read, fn, args)
+
+
+async def transaction(fn, *args):
+    # fn(cursor, *args) runs on the writer thread inside its own savepoint;
+    # resolves once the batch it landed in has committed
+    return await asyncio.wrap_future(database.BATCHER.submit(fn, *args))
+
+
+def on_rollback(fn, *args):
+    # for use inside a transaction fn, see WriteBatcher.on_rollback
+    database.BATCHER.on_rollback(fn, *args)
+
+
+async def fetchone(sql, params=()):
+    return await query(lambda cur: cur.execute(sql, params).fetchone())
+
+
+async def fetchall(sql, params=()):
+    return await query(lambda cur: cur.execute(sql, params).fetchall())
+
+
+async def execute(sql, params=()):
+    return await transaction(lambda cur: cur.execute(sql, params).rowcount)
+
+
+async def setup():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(write_executor, database.setup_databases)
+
+
+def batch_stats():
+    return database.BATCHER.stats() if database.BATCHER else {}
+
+
+@tasks.loop(minutes=database.CHECKPOINT_MINUTES)
+async def checkpoint_task():
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(write_executor, database.checkpoint)
+        # (busy, pages in the WAL, pages copied back); readers pinning old
+        # pages leave the rest for the next run
+        if result and result[2] < result[1]:
+            print(f"[DB] WAL checkpoint partial ({result[2]}/{result[1]} pages)")
+    except Exception as e:
+        print(f"[DB CHECKPOINT ERROR] {e}")
+
+
+def start_checkpoint_task():
+    if database.DB_MODE == "single" and not checkpoint_task.is_running():
+        checkpoint_task.start()
@@ -1,8 +1,11 @@
 import discord
 from discord import app_commands
 from datetime import datetime, timezone
+from typing import NamedTuple
 
-from database import ac, announcements_db, announcements_lock
+from async_db import execute, fetchall, fetchone, transaction
+from database import register_query
+from embeds import Field, Template
 
 STAFF_ROLES_IDS = {1468230337900580887}
 BOT_COMMANDS_CHANNEL = 1468449739388227695
@@ -14,6 +17,110 @@ def staff(i):
 def is_bot_commands_channel(i):
     return i.channel_id == BOT_COMMANDS_CHANNEL
 
+class Announcement(NamedTuple):
+    id: int
+    flight: str
+    departure_airport: str
+    departure_time: str
+    departure_gate: str
+    departure_terminal: str
+    arrival_airport: str
+    arrival_time: str
+    arrival_gate: str
+    date: str
+    meal_service: str
+    host: str
+    alerts: str
+    server_link: str
+    status: str
+    message_id: int
+
+ANNOUNCEMENT_COLUMNS = ", ".join(Announcement._fields)
+ANNOUNCEMENT_WARM = 500   # most recent announcements kept in memory from startup
+
+INSERT_ANNOUNCEMENT = register_query(
+    f"INSERT INTO announcements ({ANNOUNCEMENT_COLUMNS}) VALUES (NULL,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+)
+# newest announcements by rowid, stops after the LIMIT
+RECENT_ANNOUNCEMENTS = register_query(
+    f"SELECT {ANNOUNCEMENT_COLUMNS} FROM announcements ORDER BY id DESC LIMIT ?", "announcements"
+)
+ANNOUNCEMENT_BY_MESSAGE = register_query(f"SELECT {ANNOUNCEMENT_COLUMNS} FROM announcements WHERE message_id=?")
+UPDATE_ANNOUNCEMENT = register_query("UPDATE announcements SET server_link=?, status=? WHERE id=?")
+
+def _insert_announcement(cur, values):
+    cur.execute(INSERT_ANNOUNCEMENT, values)
+    return cur.lastrowid
+
+class AnnouncementStore:
+    # message_id -> Announcement, warmed at startup; older announcements
+    # come off idx_announcements_message once and then stay in the map
+    def __init__(self):
+        self.by_message = {}
+
+    async def load(self):
+        rows = await fetchall(RECENT_ANNOUNCEMENTS, (ANNOUNCEMENT_WARM,))
+        self.by_message = {row[-1]: Announcement(*row) for row in rows}
+        print(f"[BOARDING] Loaded {len(self.by_message)} announcements")
+
+    async def get(self, message_id):
+        announcement = self.by_message.get(message_id)
+        if announcement is None:
+            row = await fetchone(ANNOUNCEMENT_BY_MESSAGE, (message_id,))
+            if row:
+                announcement = self.by_message[message_id] = Announcement(*row)
+        return announcement
+
+    async def create(self, *values):
+        # values are every column after id, in table order
+        announcement_id = await transaction(_insert_announcement, values)
+        announcement = Announcement(announcement_id, *values)
+        self.by_message[announcement.message_id] = announcement
+        return announcement
+
+    async def update(self, announcement, server_link, status):
+        await execute(UPDATE_ANNOUNCEMENT, (server_link, status, announcement.id))
+        announcement = announcement._replace(server_link=server_link, status=status)
+        self.by_message[announcement.message_id] = announcement
+        return announcement
+
+ANNOUNCEMENTS = AnnouncementStore()
+
+def status_color(values):
+    return discord.Color.blue() if "on time" in values["status"].lower() else discord.Color.orange()
+
+ANNOUNCEMENT_EMBED = Template(
+    title="✈️ Boarding Announcement — {flight}",
+    color=status_color,
+    fields=[
+        Field("📅 Date", "{date}"),
+        Field("🛫 Departure", "**Airport:** {departure_airport}\n**Time:** {dep_ts}\n**Terminal:** {departure_terminal}\n**Gate:** {departure_gate}", inline=True),
+        Field("🛬 Arrival", "**Airport:** {arrival_airport}\n**Time:** {arr_ts}\n**Gate:** {arrival_gate}", inline=True),
+        Field("🍽️ Meal", "{meal_service}", inline=True),
+        Field("👨‍✈️ Host", "{host}", inline=True),
+        Field("📊 Status", "**{status}**", inline=True),
+        Field("⚠️ Alerts", "{alerts}", optional=True),
+        Field("🔗 Server Link", "{server_link}", optional=True),
+    ],
+    footer="Times auto-adjust to viewer timezone",
+    timestamp=True,
+)
+
+def discord_time(hhmm):
+    # today's date at the given UTC time, as a viewer-local Discord timestamp
+    now = datetime.now(timezone.utc)
+    dt = datetime.strptime(hhmm, "%H:%M").replace(year=now.year, month=now.month, day=now.day, tzinfo=timezone.utc)
+    return f"<t:{int(dt.timestamp())}:t>"
+
+def announcement_values(announcement):
+    values = announcement._asdict()
+    values["dep_ts"] = discord_time(announcement.departure_time)
+    values["arr_ts"] = discord_time(announcement.arrival_time)
+    return values
+
+async def load_announcements():
+    await ANNOUNCEMENTS.load()
+
 class BoardingModal1(discord.ui.Modal, title="Boarding Announcement (1/3)"):
     flight = discord.ui.TextInput(label="Flight Number", placeholder="SQ-2148")
     dep_airport = discord.ui.TextInput(label="Departure Airport", placeholder="IPPH")
@@ -98,57 +205,18 @@ class BoardingModal3(discord.ui.Modal, title="Boarding Announcement (3/3)"):
         try:
             from main import bot
             
-            dep_dt = datetime.strptime(self.dep_time, "%H:%M").replace(
-                year=datetime.utcnow().year, month=datetime.utcnow().month,
-                day=datetime.utcnow().day, tzinfo=timezone.utc
+            announcement = Announcement(
+                None, self.flight, self.dep_airport, self.dep_time, self.dep_gate, self.dep_terminal,
+                self.arr_airport, self.arr_time, self.arr_gate, self.date,
+                self.meal.value, self.host.value, self.alerts.value or "",
+                self.server.value or "", self.status.value, None
             )
-            arr_dt = datetime.strptime(self.arr_time, "%H:%M").replace(
-                year=datetime.utcnow().year, month=datetime.utcnow().month,
-                day=datetime.utcnow().day, tzinfo=timezone.utc
-            )
-            dep_ts = f"<t:{int(dep_dt.timestamp())}:t>"
-            arr_ts = f"<t:{int(arr_dt.timestamp())}:t>"
-
-            embed = discord.Embed(
-                title=f"✈️ Boarding Announcement — {self.flight}",
-                color=discord.Color.blue() if "on time" in self.status.value.lower() else discord.Color.orange(),
-                timestamp=datetime.utcnow()
-            )
-            embed.add_field(name="📅 Date", value=self.date, inline=False)
-            embed.add_field(
-                name="🛫 Departure",
-                value=f"**Airport:** {self.dep_airport}\n**Time:** {dep_ts}\n**Terminal:** {self.dep_terminal}\n**Gate:** {self.dep_gate}",
-                inline=True
-            )
-            embed.add_field(
-                name="🛬 Arrival",
-                value=f"**Airport:** {self.arr_airport}\n**Time:** {arr_ts}\n**Gate:** {self.arr_gate}",
-                inline=True
-            )
-            embed.add_field(name="🍽️ Meal", value=self.meal.value, inline=True)
-            embed.add_field(name="👨‍✈️ Host", value=self.host.value, inline=True)
-            embed.add_field(name="📊 Status", value=f"**{self.status.value}**", inline=True)
-            
-            if self.alerts.value:
-                embed.add_field(name="⚠️ Alerts", value=self.alerts.value, inline=False)
-            if self.server.value:
-                embed.add_field(name="🔗 Server Link", value=self.server.value, inline=False)
-            
-            embed.set_footer(text="Times auto-adjust to viewer timezone")
+            embed = ANNOUNCEMENT_EMBED.render(**announcement_values(announcement))
 
             channel = bot.get_channel(ANNOUNCEMENT_CHANNEL)
             msg = await channel.send(embed=embed, view=EditAnnouncementView())
 
-            with announcements_lock:
-                ac.execute("""
-                    INSERT INTO announcements VALUES (NULL,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                """, (
-                    self.flight, self.dep_airport, self.dep_time, self.dep_gate, self.dep_terminal,
-                    self.arr_airport, self.arr_time, self.arr_gate, self.date,
-                    self.meal.value, self.host.value, self.alerts.value or "",
-                    self.server.value or "", self.status.value, msg.id
-                ))
-                announcements_db.commit()
+            await ANNOUNCEMENTS.create(*announcement[1:-1], msg.id)
 
             await interaction.followup.send("✅ Announcement created!", ephemeral=True)
         except Exception as e:
@@ -166,48 +234,32 @@ class EditAnnouncementView(discord.ui.View):
         if not any(role.id in STAFF_ROLES_IDS for role in interaction.user.roles):
             return await interaction.response.send_message("❌ Staff only", ephemeral=True)
 
-        ac.execute("SELECT * FROM announcements WHERE message_id=?", (interaction.message.id,))
-        row = ac.fetchone()
+        announcement = await ANNOUNCEMENTS.get(interaction.message.id)
         
-        if not row:
+        if not announcement:
             return await interaction.response.send_message("❌ Not found", ephemeral=True)
 
-        await interaction.response.send_modal(EditAnnouncementModal(row))
+        await interaction.response.send_modal(EditAnnouncementModal(announcement))
 
 class EditAnnouncementModal(discord.ui.Modal, title="Edit Announcement"):
     server_link = discord.ui.TextInput(label="Server Link", required=False)
     status = discord.ui.TextInput(label="Status")
 
-    def __init__(self, data):
+    def __init__(self, announcement):
         super().__init__()
-        self.data = data
-        self.server_link.default = data[13]
-        self.status.default = data[14]
+        self.announcement = announcement
+        self.server_link.default = announcement.server_link
+        self.status.default = announcement.status
 
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
 
-        ac.execute("UPDATE announcements SET server_link=?, status=? WHERE id=?",
-            (self.server_link.value, self.status.value, self.data[0]))
-        announcements_db.commit()
-
-        embed = interaction.message.embeds[0]
-        fields = {f.name: f.value for f in embed.fields}
-        fields["📊 Status"] = f"**{self.status.value}**"
+        announcement = await ANNOUNCEMENTS.update(self.announcement, self.server_link.value, self.status.value)
 
-        new_embed = discord.Embed(
-            title=embed.title,
-            color=discord.Color.blue() if "on time" in self.status.value.lower() else discord.Color.orange(),
-            timestamp=datetime.utcnow()
+        # only the status and link fields are rendered again
+        new_embed = ANNOUNCEMENT_EMBED.update(
+            interaction.message.embeds[0], ("status", "server_link"), **announcement_values(announcement)
         )
-        
-        for name, value in fields.items():
-            new_embed.add_field(name=name, value=value, inline=True if name in ["🛫 Departure","🛬 Arrival","🍽️ Meal","👨‍✈️ Host","📊 Status"] else False)
-
-        if self.server_link.value:
-            new_embed.add_field(name="🔗 Server Link", value=self.server_link.value, inline=False)
-        
-        new_embed.set_footer(text="Updated")
 
         await interaction.message.edit(embed=new_embed, view=EditAnnouncementView())
         await interaction.followup.send("✅ Updated!", ephemeral=True)
@@ -1,27 +1,105 @@
+import heapq
+import os
+import re
 import sqlite3
-from threading import Lock
-
-# db locks - important for thread safety
-booking_lock = Lock()
-krispoints_lock = Lock()
-announcements_lock = Lock()
-flights_lock = Lock()
-tickets_lock = Lock()
-
-# db connections
-bookings_db = None
-krispoints_db = None
-announcements_db = None
-flights_db = None
-tickets_db = None
-
-bc = None
-kc = None
-ac = None
-fc = None
-tc = None
-
-FLIGHTS = {}
+import time
+from datetime import datetime, timezone
+from concurrent.futures import Future
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+
+# "single" keeps every table in one WAL database, "legacy" keeps the old five files
+DB_MODE = os.getenv("DB_MODE", "single").lower()
+DB_PATH = os.getenv("DB_PATH", "anz.db")
+
+# FULL: a batch future only resolves once its commit is on disk; NORMAL in WAL
+# mode is faster but can lose the last commits on power loss
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "FULL")
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative = KiB
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_TEMP_STORE = os.getenv("DB_TEMP_STORE", "MEMORY")
+CHECKPOINT_MINUTES = float(os.getenv("DB_CHECKPOINT_MINUTES", "5"))
+
+# group commit: writes landing within the window share one transaction
+BATCH_WINDOW_MS = float(os.getenv("DB_BATCH_WINDOW_MS", "5"))
+BATCH_MAX = int(os.getenv("DB_BATCH_MAX", "64"))
+
+DB_FILES = {
+    "bookings": "bookings.db",
+    "krispoints": "krispoints.db",
+    "announcements": "announcements.db",
+    "flights": "flights.db",
+    "tickets": "tickets.db",
+}
+
+# every table is reachable from the one pool in both modes, so a single
+# write transaction can span bookings, krispoints, flights, ...
+POOL = None
+BATCHER = None
+
+class FlightTable(dict):
+    # FLIGHTS itself: flight_code -> (route, aircraft, time), with a prefix
+    # index over code, route and destination kept in step on every change
+    MAX_PREFIX = 12
+
+    def __init__(self):
+        super().__init__()
+        self._prefixes = {}
+        self._keys = {}
+
+    def _tokens(self, code, route):
+        tokens = {code.lower(), route.lower()}
+        tokens.update(t for t in re.split(r"\s*->\s*|\s+", route.lower()) if t)
+        return tokens
+
+    def _index(self, code, route):
+        keys = set()
+        for token in self._tokens(code, route):
+            for n in range(1, min(len(token), self.MAX_PREFIX) + 1):
+                keys.add(token[:n])
+        for key in keys:
+            self._prefixes.setdefault(key, set()).add(code)
+        self._keys[code] = keys
+
+    def _unindex(self, code):
+        for key in self._keys.pop(code, ()):
+            codes = self._prefixes.get(key)
+            if codes is not None:
+                codes.discard(code)
+                if not codes:
+                    del self._prefixes[key]
+
+    def __setitem__(self, code, value):
+        if code in self:
+            self._unindex(code)
+        super().__setitem__(code, value)
+        self._index(code, value[0])
+
+    def __delitem__(self, code):
+        super().__delitem__(code)
+        self._unindex(code)
+
+    def pop(self, code, *default):
+        if code in self:
+            self._unindex(code)
+        return super().pop(code, *default)
+
+    def clear(self):
+        super().clear()
+        self._prefixes.clear()
+        self._keys.clear()
+
+    def search(self, text, limit=25):
+        text = text.strip().lower()
+        if not text:
+            return heapq.nsmallest(limit, self)
+        codes = self._prefixes.get(text[:self.MAX_PREFIX], ())
+        if len(text) > self.MAX_PREFIX:
+            codes = [c for c in codes if any(t.startswith(text) for t in self._tokens(c, self[c][0]))]
+        return heapq.nsmallest(limit, codes)
+
+FLIGHTS = FlightTable()
 
 def get_db_connection(db_name):
     return sqlite3.connect(
@@ -31,108 +109,774 @@ def get_db_connection(db_name):
         isolation_level='IMMEDIATE'
     )
 
-def setup_databases():
-    global bookings_db, krispoints_db, announcements_db, flights_db, tickets_db
-    global bc, kc, ac, fc, tc
-    
-    # bookings db
-    bookings_db = get_db_connection("bookings.db")
-    bc = bookings_db.cursor()
-    bc.execute("""
-    CREATE TABLE IF NOT EXISTS bookings (
-        code TEXT PRIMARY KEY,
-        flight TEXT,
-        route TEXT,
-        aircraft TEXT,
-        time TEXT,
-        cabin TEXT,
-        who TEXT,
-        roblox TEXT,
-        discord_id TEXT,
-        booked_by INTEGER
+def schema(name):
+    # schema a table lives in: everything is "main" in single mode,
+    # legacy mode opens bookings.db and attaches the rest under their own names
+    if DB_MODE == "single" or name == "bookings":
+        return "main"
+    return name
+
+def open_connection():
+    if DB_MODE == "single":
+        conn = get_db_connection(DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+    else:
+        conn = get_db_connection(DB_FILES["bookings"])
+        for name, path in DB_FILES.items():
+            if name != "bookings":
+                conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+
+    conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA temp_store={DB_TEMP_STORE}")
+    return conn
+
+class ConnectionPool:
+    # readers get their own pooled connection, writers share one behind a lock
+    def __init__(self, connect, size=4):
+        self.connect = connect
+        self._idle = Queue(maxsize=size)
+        self._writer = connect()
+        self._write_lock = Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return self.connect()
+
+    def _checkin(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    @contextmanager
+    def read(self):
+        conn = self._checkout()
+        cur = conn.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+            self._checkin(conn)
+
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            cur = self._writer.cursor()
+            try:
+                yield cur
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+class WriteBatcher:
+    # collects writes for a short window (or up to max_batch of them), runs
+    # each in its own savepoint and commits the lot once; futures resolve
+    # only after that commit
+    def __init__(self, pool, window_ms=BATCH_WINDOW_MS, max_batch=BATCH_MAX):
+        self.pool = pool
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._jobs = Queue()
+        self._undo = []
+
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.max_size = 0
+        self.commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+        self._thread = Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._jobs.put((fn, args, future, time.perf_counter()))
+        return future
+
+    def on_rollback(self, fn, *args):
+        # called from inside a job: fn(*args) runs on the writer thread if the
+        # job's savepoint or its whole batch rolls back, so in-memory state
+        # built on the job's writes is dropped along with them
+        self._undo.append((fn, args))
+
+    def _rollback(self, undo):
+        for fn, args in reversed(undo):
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[DB] Rollback hook failed: {e}")
+
+    def _collect(self):
+        batch = [self._jobs.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._jobs.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            outcomes = []
+            undo = []
+
+            try:
+                with self.pool.write() as cur:
+                    if not cur.connection.in_transaction:
+                        cur.execute("BEGIN IMMEDIATE")
+                    for fn, args, future, queued in batch:
+                        self._undo = []
+                        cur.execute("SAVEPOINT batch_item")
+                        try:
+                            outcomes.append((future, fn(cur, *args), None))
+                            cur.execute("RELEASE batch_item")
+                            undo.extend(self._undo)
+                        except Exception as e:
+                            cur.execute("ROLLBACK TO batch_item")
+                            cur.execute("RELEASE batch_item")
+                            self._rollback(self._undo)
+                            outcomes.append((future, None, e))
+                        self._undo = []
+            except Exception as e:
+                # the commit itself failed, nothing in this batch is durable
+                self._rollback(undo + self._undo)
+                self._undo = []
+                outcomes = [(job[2], None, e) for job in batch]
+
+            done = time.perf_counter()
+            self._record(batch, outcomes, started, done)
+
+            for future, result, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _record(self, batch, outcomes, started, done):
+        commit_ms = (done - started) * 1000
+        wait_ms = (done - min(job[3] for job in batch)) * 1000
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.failed += sum(1 for o in outcomes if o[2] is not None)
+        self.max_size = max(self.max_size, len(batch))
+        self.commit_ms += commit_ms
+        self.max_commit_ms = max(self.max_commit_ms, commit_ms)
+        self.wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self):
+        batches = self.batches or 1
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "avg_size": self.writes / batches,
+            "max_size": self.max_size,
+            "avg_commit_ms": self.commit_ms / batches,
+            "max_commit_ms": self.max_commit_ms,
+            "avg_wait_ms": self.wait_ms / batches,
+            "max_wait_ms": self.max_wait_ms,
+            "queued": self._jobs.qsize(),
+        }
+
+# seats per cabin given to a new flight that does not set its own
+CABIN_CAPACITY = {
+    "Economy": 8,
+    "Premium Economy": 4,
+    "Business": 2,
+    "First Class": 1,
+}
+
+# flights column holding a flight's own capacity for the cabin, NULL for
+# the default above; set on insert or later through /setcapacity
+CABIN_SEAT_COLUMNS = {
+    "Economy": "economy_seats",
+    "Premium Economy": "premium_economy_seats",
+    "Business": "business_seats",
+    "First Class": "first_class_seats",
+}
+
+CABIN_SEATS_SQL = " UNION ALL ".join(
+    f"SELECT NEW.flight_code, '{cabin}', {seats}, {seats}" for cabin, seats in CABIN_CAPACITY.items()
+)
+
+def cabin_seats_sql(cabin):
+    return f"COALESCE(NEW.{CABIN_SEAT_COLUMNS[cabin]}, {CABIN_CAPACITY[cabin]})"
+
+FLIGHT_SEATS_SQL = " UNION ALL ".join(
+    f"SELECT NEW.flight_code, '{cabin}', {cabin_seats_sql(cabin)}, {cabin_seats_sql(cabin)}"
+    for cabin in CABIN_CAPACITY
+)
+
+# remaining moves with capacity (SET reads the old capacity); the CHECK on
+# remaining refuses a capacity below the seats already booked
+CAPACITY_UPDATE_SQL = "\n".join(
+    f"UPDATE seat_inventory SET capacity = {cabin_seats_sql(cabin)}, "
+    f"remaining = remaining + {cabin_seats_sql(cabin)} - capacity "
+    f"WHERE flight = NEW.flight_code AND cabin = '{cabin}';"
+    for cabin in CABIN_CAPACITY
+)
+
+def backfill_seat_inventory(cur):
+    flights = [row[0] for row in cur.execute("SELECT flight_code FROM flights")]
+    booked = dict(
+        ((flight, cabin), count) for flight, cabin, count in
+        cur.execute("SELECT flight, cabin, COUNT(*) FROM bookings GROUP BY flight, cabin")
     )
-    """)
-    bookings_db.commit()
-
-    # krispoints db
-    krispoints_db = get_db_connection("krispoints.db")
-    kc = krispoints_db.cursor()
-    kc.execute("""
-    CREATE TABLE IF NOT EXISTS krispoints (
-        user_id INTEGER PRIMARY KEY,
-        balance INTEGER DEFAULT 0,
-        flights INTEGER DEFAULT 0
+    cur.executemany(
+        "INSERT OR IGNORE INTO seat_inventory VALUES (?,?,?,?)",
+        [
+            (flight, cabin, seats, max(seats - booked.get((flight, cabin), 0), 0))
+            for flight in flights for cabin, seats in CABIN_CAPACITY.items()
+        ]
     )
-    """)
-    krispoints_db.commit()
-
-    # announcements db
-    announcements_db = get_db_connection("announcements.db")
-    ac = announcements_db.cursor()
-    ac.execute("""
-    CREATE TABLE IF NOT EXISTS announcements (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        flight TEXT,
-        departure_airport TEXT,
-        departure_time TEXT,
-        departure_gate TEXT,
-        departure_terminal TEXT,
-        arrival_airport TEXT,
-        arrival_time TEXT,
-        arrival_gate TEXT,
-        date TEXT,
-        meal_service TEXT,
-        host TEXT,
-        alerts TEXT,
-        server_link TEXT,
-        status TEXT,
-        message_id INTEGER
+
+# flights store d/m/YYYY and H:MM text, zero padding optional, always read
+# as UTC; departure_epoch() and epoch_sql() apply the same rule, anything
+# else (or a date that does not exist) gets a NULL epoch on both paths
+DEPARTURE_DATE_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})", re.ASCII)
+DEPARTURE_TIME_RE = re.compile(r"(\d{1,2}):(\d{1,2})", re.ASCII)
+
+def departure_epoch(dep_date, dep_time):
+    date = DEPARTURE_DATE_RE.fullmatch(dep_date or "")
+    clock = DEPARTURE_TIME_RE.fullmatch(dep_time or "")
+    if not date or not clock:
+        return None
+    day, month, year = map(int, date.groups())
+    hour, minute = map(int, clock.groups())
+    try:
+        return int(datetime(year, month, day, hour, minute, tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+def epoch_sql(dep_date, dep_time):
+    # split on the separators, check each part's digits, then pad; sqlite
+    # rolls 31/2 over into March and accepts 24:00, so the stamp must come
+    # back unchanged from its own epoch
+    rest = f"substr({dep_date}, instr({dep_date}, '/') + 1)"
+    day = f"substr({dep_date}, 1, instr({dep_date}, '/') - 1)"
+    month = f"substr({rest}, 1, instr({rest}, '/') - 1)"
+    year = f"substr({rest}, instr({rest}, '/') + 1)"
+    hour = f"substr({dep_time}, 1, instr({dep_time}, ':') - 1)"
+    minute = f"substr({dep_time}, instr({dep_time}, ':') + 1)"
+    stamp = f"printf('%04d-%02d-%02d %02d:%02d', {year}, {month}, {day}, {hour}, {minute})"
+    valid = " AND ".join(
+        [f"({part} GLOB '[0-9]' OR {part} GLOB '[0-9][0-9]')" for part in (day, month, hour, minute)]
+        + [f"{year} GLOB '[0-9][0-9][0-9][0-9]'", f"CAST({year} AS INTEGER) > 0",
+           f"strftime('%Y-%m-%d %H:%M', strftime('%s', {stamp}), 'unixepoch') = {stamp}"]
     )
-    """)
-    announcements_db.commit()
-
-    # flights db
-    flights_db = get_db_connection("flights.db")
-    fc = flights_db.cursor()
-    fc.execute("""
-    CREATE TABLE IF NOT EXISTS flights (
-        flight_code TEXT PRIMARY KEY,
-        route TEXT,
-        aircraft TEXT,
-        departure_time TEXT,
-        departure_date TEXT
+    return f"CASE WHEN {valid} THEN CAST(strftime('%s', {stamp}) AS INTEGER) END"
+
+EPOCH_SQL = epoch_sql("NEW.departure_date", "NEW.departure_time")
+
+EPOCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {{flights}}.trg_flights_epoch_insert
+    AFTER INSERT ON flights WHEN NEW.departure_epoch IS NULL BEGIN
+        UPDATE flights SET departure_epoch = {EPOCH_SQL}
+        WHERE flight_code = NEW.flight_code;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {{flights}}.trg_flights_epoch_update
+    AFTER UPDATE OF departure_date, departure_time ON flights BEGIN
+        UPDATE flights SET departure_epoch = {EPOCH_SQL}
+        WHERE flight_code = NEW.flight_code;
+    END
+    """,
+]
+
+def backfill_departure_epochs(cur):
+    rows = cur.execute(
+        "SELECT flight_code, departure_date, departure_time FROM flights WHERE departure_epoch IS NULL"
+    ).fetchall()
+    cur.executemany(
+        "UPDATE flights SET departure_epoch=? WHERE flight_code=?",
+        [(departure_epoch(d, t), code) for code, d, t in rows]
     )
-    """)
-    flights_db.commit()
-
-    # tickets db
-    tickets_db = get_db_connection("tickets.db")
-    tc = tickets_db.cursor()
-    tc.execute("""
-    CREATE TABLE IF NOT EXISTS tickets (
-        ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ticket_number TEXT UNIQUE,
-        channel_id INTEGER,
-        user_id INTEGER,
-        category TEXT,
-        title TEXT,
-        created_at TEXT,
-        status TEXT DEFAULT 'open',
-        transcript TEXT DEFAULT ''
+
+# (version, description, steps) - a step is SQL or a callable taking the
+# cursor; SQL may use {bookings}, {krispoints}, ... for the table's schema
+MIGRATIONS = [
+    (1, "secondary indexes for hot lookups", [
+        "CREATE INDEX IF NOT EXISTS {bookings}.idx_bookings_flight ON bookings(flight)",
+        "CREATE INDEX IF NOT EXISTS {tickets}.idx_tickets_category ON tickets(category)",
+        "CREATE INDEX IF NOT EXISTS {tickets}.idx_tickets_channel ON tickets(channel_id)",
+        "CREATE INDEX IF NOT EXISTS {announcements}.idx_announcements_message ON announcements(message_id)",
+        "CREATE INDEX IF NOT EXISTS {krispoints}.idx_krispoints_balance ON krispoints(balance DESC)",
+    ]),
+    (2, "per-flight passenger counters maintained by triggers", [
+        """
+        CREATE TABLE IF NOT EXISTS {bookings}.flight_pax (
+            flight TEXT PRIMARY KEY,
+            pax INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {bookings}.trg_flight_pax_insert
+        AFTER INSERT ON bookings BEGIN
+            INSERT INTO flight_pax (flight, pax) VALUES (NEW.flight, 1)
+            ON CONFLICT(flight) DO UPDATE SET pax = pax + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {bookings}.trg_flight_pax_delete
+        AFTER DELETE ON bookings BEGIN
+            UPDATE flight_pax SET pax = pax - 1 WHERE flight = OLD.flight;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {bookings}.trg_flight_pax_update
+        AFTER UPDATE OF flight ON bookings WHEN NEW.flight IS NOT OLD.flight BEGIN
+            UPDATE flight_pax SET pax = pax - 1 WHERE flight = OLD.flight;
+            INSERT INTO flight_pax (flight, pax) VALUES (NEW.flight, 1)
+            ON CONFLICT(flight) DO UPDATE SET pax = pax + 1;
+        END
+        """,
+        "DELETE FROM {bookings}.flight_pax",
+        "INSERT INTO {bookings}.flight_pax (flight, pax) SELECT flight, COUNT(*) FROM bookings GROUP BY flight",
+    ]),
+    (3, "indexed UTC departure epoch on flights", [
+        "ALTER TABLE {flights}.flights ADD COLUMN departure_epoch INTEGER",
+        "CREATE INDEX IF NOT EXISTS {flights}.idx_flights_departure ON flights(departure_epoch)",
+        backfill_departure_epochs,
+        *EPOCH_TRIGGERS,
+    ]),
+    (4, "archive table for bookings of departed flights", [
+        """
+        CREATE TABLE IF NOT EXISTS {bookings}.bookings_archive (
+            code TEXT,
+            flight TEXT,
+            route TEXT,
+            aircraft TEXT,
+            time TEXT,
+            cabin TEXT,
+            who TEXT,
+            roblox TEXT,
+            discord_id TEXT,
+            booked_by INTEGER,
+            archived_at INTEGER
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS {bookings}.idx_bookings_archive_flight ON bookings_archive(flight)",
+    ]),
+    (5, "persisted sequence for booking codes", [
+        """
+        CREATE TABLE IF NOT EXISTS {bookings}.code_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_value INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO {bookings}.code_sequence VALUES (1, 0)",
+    ]),
+    (6, "per-flight, per-cabin seat inventory replaces flight_pax", [
+        """
+        CREATE TABLE IF NOT EXISTS {flights}.seat_inventory (
+            flight TEXT,
+            cabin TEXT,
+            capacity INTEGER NOT NULL,
+            remaining INTEGER NOT NULL CHECK (remaining >= 0),
+            PRIMARY KEY (flight, cabin)
+        )
+        """,
+        backfill_seat_inventory,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {{flights}}.trg_seat_inventory_insert
+        AFTER INSERT ON flights BEGIN
+            INSERT OR IGNORE INTO seat_inventory (flight, cabin, capacity, remaining)
+            {CABIN_SEATS_SQL};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {flights}.trg_seat_inventory_delete
+        AFTER DELETE ON flights BEGIN
+            DELETE FROM seat_inventory WHERE flight = OLD.flight_code;
+        END
+        """,
+        "DROP TRIGGER IF EXISTS {bookings}.trg_flight_pax_insert",
+        "DROP TRIGGER IF EXISTS {bookings}.trg_flight_pax_delete",
+        "DROP TRIGGER IF EXISTS {bookings}.trg_flight_pax_update",
+        "DROP TABLE IF EXISTS {bookings}.flight_pax",
+    ]),
+    (7, "persistent DM outbox", [
+        """
+        CREATE TABLE IF NOT EXISTS dm_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            payload TEXT,
+            file_name TEXT,
+            file_data BLOB,
+            attempts INTEGER DEFAULT 0,
+            next_attempt REAL,
+            status TEXT DEFAULT 'pending',
+            created_at REAL,
+            last_error TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_dm_outbox_due ON dm_outbox(status, next_attempt)",
+    ]),
+    (8, "covering indexes for keyset-paginated booking lists", [
+        "CREATE INDEX IF NOT EXISTS {bookings}.idx_bookings_booker ON bookings(booked_by, code, flight, route, time, cabin, roblox)",
+        "CREATE INDEX IF NOT EXISTS {bookings}.idx_bookings_passenger ON bookings(discord_id, code, flight, route, time, cabin, roblox)",
+        "CREATE INDEX IF NOT EXISTS {bookings}.idx_bookings_manifest ON bookings(flight, code, cabin, who, roblox, discord_id)",
+        # the manifest index starts with flight, so it serves every flight lookup
+        "DROP INDEX IF EXISTS {bookings}.idx_bookings_flight",
+    ]),
+    (9, "append-only airpoints ledger", [
+        """
+        CREATE TABLE IF NOT EXISTS {krispoints}.krispoints_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            flights INTEGER NOT NULL,
+            flight TEXT,
+            reason TEXT,
+            staff_id INTEGER,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS {krispoints}.idx_ledger_user ON krispoints_ledger(user_id, id)",
+        "CREATE INDEX IF NOT EXISTS {krispoints}.idx_ledger_created ON krispoints_ledger(created_at)",
+        # existing balances become each user's opening snapshot
+        """
+        INSERT INTO {krispoints}.krispoints_ledger (user_id, kind, delta, balance, flights, reason, created_at)
+        SELECT user_id, 'snapshot', balance, balance, flights, 'opening balance', strftime('%s', 'now')
+        FROM {krispoints}.krispoints
+        """,
+    ]),
+    (10, "departure epochs for dates and times without zero padding", [
+        # the v3 triggers read fixed offsets and left e.g. 5/3/2026 9:05 NULL
+        "DROP TRIGGER IF EXISTS {flights}.trg_flights_epoch_insert",
+        "DROP TRIGGER IF EXISTS {flights}.trg_flights_epoch_update",
+        *EPOCH_TRIGGERS,
+        backfill_departure_epochs,
+    ]),
+    (11, "departure board page messages", [
+        """
+        CREATE TABLE IF NOT EXISTS {flights}.board_pages (
+            page INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL
+        )
+        """,
+    ]),
+    (12, "drop the balance index, the leaderboard is ranked in memory", [
+        "DROP INDEX IF EXISTS {krispoints}.idx_krispoints_balance",
+    ]),
+    (13, "per-flight cabin capacity", [
+        *(
+            f"ALTER TABLE {{flights}}.flights ADD COLUMN {column} INTEGER CHECK ({column} >= 0)"
+            for column in CABIN_SEAT_COLUMNS.values()
+        ),
+        "DROP TRIGGER IF EXISTS {flights}.trg_seat_inventory_insert",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {{flights}}.trg_seat_inventory_insert
+        AFTER INSERT ON flights BEGIN
+            INSERT OR IGNORE INTO seat_inventory (flight, cabin, capacity, remaining)
+            {FLIGHT_SEATS_SQL};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {{flights}}.trg_seat_inventory_capacity
+        AFTER UPDATE OF {", ".join(CABIN_SEAT_COLUMNS.values())} ON flights BEGIN
+            {CAPACITY_UPDATE_SQL}
+        END
+        """,
+    ]),
+    (14, "archived bookings keep their departure, one award per departure", [
+        "ALTER TABLE {bookings}.bookings_archive ADD COLUMN departure_epoch INTEGER",
+        "CREATE INDEX IF NOT EXISTS {bookings}.idx_bookings_archive_departure ON bookings_archive(flight, departure_epoch)",
+        # the new index starts with flight, so it serves every flight lookup
+        "DROP INDEX IF EXISTS {bookings}.idx_bookings_archive_flight",
+        """
+        CREATE TABLE IF NOT EXISTS {krispoints}.flight_awards (
+            flight TEXT NOT NULL,
+            departure_epoch INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            staff_id INTEGER,
+            awarded_at REAL NOT NULL,
+            PRIMARY KEY (flight, departure_epoch)
+        )
+        """,
+    ]),
+    (15, "ledger compaction ranges over entries not yet folded", [
+        "DROP INDEX IF EXISTS {krispoints}.idx_ledger_created",
+        """
+        CREATE INDEX IF NOT EXISTS {krispoints}.idx_ledger_unfolded
+        ON krispoints_ledger(created_at, user_id) WHERE kind != 'snapshot'
+        """,
+    ]),
+]
+
+# every query the bot runs in production, checked by check_query_plans();
+# (sql, table it may scan on purpose or None). modules register their SQL
+# constants here as they are defined, so the list is the code that runs
+QUERIES = []
+
+# modules whose import registers the rest of QUERIES
+QUERY_MODULES = ["airpoints", "boarding", "departureboard", "dm_outbox", "flightbooking", "tickets"]
+
+def register_query(sql, scan_ok=None):
+    # IN-lists are written as ({marks}) and filled in per call
+    QUERIES.append((sql, scan_ok))
+    return sql
+
+# startup load reads the whole table on purpose
+LOAD_FLIGHTS = register_query("SELECT flight_code, route, aircraft, departure_time FROM flights", "flights")
+
+def qualify(sql):
+    return sql.format(**{name: schema(name) for name in DB_FILES})
+
+def run_migrations(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TEXT
     )
     """)
-    tickets_db.commit()
+    applied = {row[0] for row in cur.execute("SELECT version FROM schema_migrations")}
+
+    conn = cur.connection
+    conn.commit()
+
+    for version, description, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        # sqlite3 only opens a transaction before DML, so DDL would autocommit
+        # step by step; an explicit BEGIN commits the steps and the version
+        # row together or not at all
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(qualify(step))
+            cur.execute(
+                "INSERT INTO schema_migrations VALUES (?,?,datetime('now'))",
+                (version, description)
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            print(f"[DB] Migration {version} failed, rolled back: {description}")
+            raise
+        print(f"[DB] Applied migration {version}: {description}")
+
+def schema_version():
+    with POOL.read() as cur:
+        cur.execute("SELECT MAX(version) FROM schema_migrations")
+        return cur.fetchone()[0] or 0
+
+def check_query_plans():
+    # returns (sql, plan) for every query that fell back to a table or index scan
+    failures = []
+    with POOL.read() as cur:
+        for sql, scan_ok in QUERIES:
+            sql = sql.replace("{marks}", "?, ?")
+            params = (None,) * sql.count("?")
+            plan = [row[3] for row in cur.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            # a walk over a whole index is still a scan, only the tables
+            # whitelisted for the query may be read end to end
+            scans = [d for d in plan if d.startswith("SCAN") and d.split()[1] != scan_ok]
+            if scans:
+                failures.append((sql, plan))
+    return failures
+
+def migrate_legacy_files():
+    # one-shot copy of the old per-table files into the single database
+    legacy = {n: p for n, p in DB_FILES.items() if os.path.exists(p)}
+    if not legacy:
+        return
+
+    conn = get_db_connection(DB_PATH)
+    try:
+        for name, path in legacy.items():
+            conn.execute(f"ATTACH DATABASE ? AS legacy_{name}", (path,))
+
+        for name in legacy:
+            cols = [r[1] for r in conn.execute(f"PRAGMA legacy_{name}.table_info({name})")]
+            if not cols:
+                continue
+            col_list = ", ".join(cols)
+            conn.execute(
+                f"INSERT OR IGNORE INTO main.{name} ({col_list}) "
+                f"SELECT {col_list} FROM legacy_{name}.{name}"
+            )
+        conn.commit()
+
+        for name in legacy:
+            conn.execute(f"DETACH DATABASE legacy_{name}")
+    finally:
+        conn.close()
+
+    for name, path in legacy.items():
+        os.replace(path, path + ".migrated")
+        print(f"[DB] Migrated {path} into {DB_PATH}")
+
+def checkpoint():
+    # folds the WAL back into the main file so it does not grow unbounded;
+    # PASSIVE copies what no reader still needs and never waits, so it runs
+    # on a pooled connection and the writer is never held up behind it
+    if DB_MODE != "single":
+        return None
+    with POOL.read() as cur:
+        cur.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return cur.fetchone()
+
+def setup_databases():
+    global POOL, BATCHER
+
+    if POOL is None:
+        POOL = ConnectionPool(open_connection)
+    if BATCHER is None:
+        BATCHER = WriteBatcher(POOL)
+
+    # bookings
+    with POOL.write() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema("bookings")}.bookings (
+            code TEXT PRIMARY KEY,
+            flight TEXT,
+            route TEXT,
+            aircraft TEXT,
+            time TEXT,
+            cabin TEXT,
+            who TEXT,
+            roblox TEXT,
+            discord_id TEXT,
+            booked_by INTEGER
+        )
+        """)
+
+    # krispoints
+    with POOL.write() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema("krispoints")}.krispoints (
+            user_id INTEGER PRIMARY KEY,
+            balance INTEGER DEFAULT 0,
+            flights INTEGER DEFAULT 0
+        )
+        """)
+
+    # announcements
+    with POOL.write() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema("announcements")}.announcements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            flight TEXT,
+            departure_airport TEXT,
+            departure_time TEXT,
+            departure_gate TEXT,
+            departure_terminal TEXT,
+            arrival_airport TEXT,
+            arrival_time TEXT,
+            arrival_gate TEXT,
+            date TEXT,
+            meal_service TEXT,
+            host TEXT,
+            alerts TEXT,
+            server_link TEXT,
+            status TEXT,
+            message_id INTEGER
+        )
+        """)
+
+    # flights
+    with POOL.write() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema("flights")}.flights (
+            flight_code TEXT PRIMARY KEY,
+            route TEXT,
+            aircraft TEXT,
+            departure_time TEXT,
+            departure_date TEXT
+        )
+        """)
+
+    # tickets
+    with POOL.write() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema("tickets")}.tickets (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_number TEXT UNIQUE,
+            channel_id INTEGER,
+            user_id INTEGER,
+            category TEXT,
+            title TEXT,
+            created_at TEXT,
+            status TEXT DEFAULT 'open',
+            transcript TEXT DEFAULT ''
+        )
+        """)
+
+    if DB_MODE == "single":
+        migrate_legacy_files()
+
+    with POOL.write() as cur:
+        run_migrations(cur)
+
+    for sql, plan in check_query_plans():
+        print(f"[DB] Scan in query plan: {sql} -> {plan}")
 
     load_flights()
-    print("[DB] All databases initialized")
+    print(f"[DB] All databases initialized ({DB_MODE} mode, schema v{schema_version()})")
 
 def load_flights():
     try:
-        fc.execute("SELECT flight_code, route, aircraft, departure_time FROM flights")
-        rows = fc.fetchall()
+        with POOL.read() as cur:
+            cur.execute(LOAD_FLIGHTS)
+            rows = cur.fetchall()
         FLIGHTS.clear()
-        for code, route, aircraft, time in rows:
-            FLIGHTS[code] = (route, aircraft, time)
+        for code, route, aircraft, dep_time in rows:
+            FLIGHTS[code] = (route, aircraft, dep_time)
         print(f"[FLIGHTS] Loaded {len(FLIGHTS)} flights")
     except Exception as e:
-        print(f"[FLIGHTS ERROR] {e}")
\ No newline at end of file
+        print(f"[FLIGHTS ERROR] {e}")
+
+if __name__ == "__main__":
+    import sys
+
+    # python database.py --check-plans: fails if any production query scans a table
+    if "--check-plans" in sys.argv:
+        import importlib
+
+        # the query modules register into the importable database module,
+        # not into this __main__ copy
+        db = importlib.import_module("database")
+        for name in QUERY_MODULES:
+            importlib.import_module(name)
+        db.setup_databases()
+        failures = db.check_query_plans()
+        for sql, plan in failures:
+            print(f"SCAN: {sql}\n    {plan}")
+        print(f"{len(db.QUERIES) - len(failures)}/{len(db.QUERIES)} query plans ok")
+        sys.exit(1 if failures else 0)
@@ -1,149 +1,263 @@
 import discord
 from discord.ext import tasks
 from datetime import datetime, timezone, timedelta
+import asyncio
+import hashlib
+import time
 
-from database import fc, flights_db, bc, flights_lock, FLIGHTS
+from database import FLIGHTS, register_query
+from async_db import execute, fetchall, transaction
+from embeds import Template
 
 DEPARTURE_BOARD_CHANNEL = 1469359444692570122
 
-departure_board_message_id = None
+BOARD_DEBOUNCE_SECONDS = 3   # let a burst of bookings settle before rendering
+BOARD_MIN_INTERVAL = 5       # never edit the board more often than this
+BOARD_MAX_IDLE = 600         # refresh anyway in case flights changed outside the bot
+
+# minutes before departure at which a flight enters each status
+STATUS_THRESHOLDS = [(-30, "DEPARTED"), (0, "DEPARTING"), (30, "BOARDING"), (120, "CHECK-IN")]
+
+def flight_status(dep_epoch, now_ts):
+    if dep_epoch is None:
+        return "SCHEDULED"
+    
+    time_diff = (dep_epoch - now_ts) / 60
+    
+    for minutes, status in STATUS_THRESHOLDS:
+        if time_diff < minutes:
+            return status
+    return "SCHEDULED"
+
+def next_transition(dep_epoch, now_ts):
+    # epoch of this flight's next status change, None once it has departed
+    if dep_epoch is None:
+        return None
+    upcoming = [dep_epoch - minutes * 60 for minutes, _ in STATUS_THRESHOLDS]
+    upcoming = [t for t in upcoming if t > now_ts]
+    return min(upcoming) if upcoming else None
+
+DEPARTED = register_query("SELECT flight_code FROM flights WHERE departure_epoch < ?")
+# archived rows keep the departure they flew on, flight codes are reused
+ARCHIVE_DEPARTED = register_query("""
+    INSERT INTO bookings_archive (code, flight, route, aircraft, time, cabin, who, roblox,
+                                  discord_id, booked_by, archived_at, departure_epoch)
+    SELECT b.code, b.flight, b.route, b.aircraft, b.time, b.cabin, b.who, b.roblox,
+           b.discord_id, b.booked_by, ?, f.departure_epoch
+    FROM flights f JOIN bookings b ON b.flight = f.flight_code
+    WHERE f.departure_epoch < ?
+""")
+DELETE_DEPARTED_BOOKINGS = register_query(f"DELETE FROM bookings WHERE flight IN ({DEPARTED})")
+DELETE_DEPARTED = register_query("DELETE FROM flights WHERE departure_epoch < ?")
+# the board reads the whole table on purpose; seat counts come straight
+# from the per-cabin inventory
+BOARD_FLIGHTS = register_query("""
+    SELECT flight_code, route, aircraft, departure_time, departure_date, departure_epoch,
+        (SELECT SUM(capacity) FROM seat_inventory WHERE flight = flight_code),
+        (SELECT SUM(remaining) FROM seat_inventory WHERE flight = flight_code)
+    FROM flights ORDER BY departure_epoch NULLS LAST
+""", "flights")
+# a handful of rows, read once on startup
+BOARD_PAGE_IDS = register_query("SELECT page, message_id FROM board_pages ORDER BY page", "board_pages")
+SAVE_BOARD_PAGE = register_query("""
+    INSERT INTO board_pages (page, message_id) VALUES (?, ?)
+    ON CONFLICT(page) DO UPDATE SET message_id = excluded.message_id
+""")
+DROP_BOARD_PAGES = register_query("DELETE FROM board_pages WHERE page >= ?")
+
+def _remove_departed(cur, cutoff, now_ts):
+    # one pass: archive their bookings, then drop the flights (their seat
+    # inventory goes with them by trigger)
+    codes = [row[0] for row in cur.execute(DEPARTED, (cutoff,))]
+    if not codes:
+        return []
+    
+    cur.execute(ARCHIVE_DEPARTED, (now_ts, cutoff))
+    cur.execute(DELETE_DEPARTED_BOOKINGS, (cutoff,))
+    cur.execute(DELETE_DEPARTED, (cutoff,))
+    return codes
+
+BOARD_TITLE = "🛫 AIR NEW ZEALAND DEPARTURES"
+BOARD_INTRO = "**✈️ LIVE DEPARTURE BOARD**\n"
+BOARD_HEADER = "FLIGHT    DEST         DATE/TIME         STATUS      PAX\n" + "=" * 65 + "\n"
+# embed descriptions cap at 4096 characters, keep room for the intro and fences
+PAGE_LIMIT = 4096 - len(BOARD_INTRO) - len(BOARD_HEADER) - len("```\n```") - 16
+
+BOARD_PAGE = Template(
+    title="{title}",
+    description="{body}",
+    color=discord.Color.blue(),
+    footer="All times UTC • Updates live",
+    timestamp=True,
+)
+
+# one [message, content hash] per page, kept so only changed pages get edited;
+# the message ids are persisted so a restart edits the same messages
+board_pages = []
+board_pages_loaded = False
+BOARD_STATS = {"sent": 0, "skipped": 0}
+
+board_dirty = asyncio.Event()
+next_board_transition = None
+board_task = None
+
+def request_board_update():
+    # called after bookings and cleanup; the publisher debounces the bursts
+    board_dirty.set()
+
+def board_rows(flights, now_ts):
+    for flight_code, route, aircraft, dep_time, dep_date, dep_epoch, capacity, remaining in flights:
+        if not dep_date:
+            continue
+            
+        dest = route.split("->")[1] if "->" in route else route
+        dest = dest[:12].ljust(12)
+        
+        status = flight_status(dep_epoch, now_ts)
+        date_time_str = f"{dep_date} {dep_time}"
+        
+        pax_str = f"{capacity - remaining}/{capacity}" if capacity else "-"
+        yield f"{flight_code:<9} {dest} {date_time_str:<17} {status:<11} {pax_str}\n"
+
+def paginate(rows, limit=PAGE_LIMIT):
+    page, size = [], 0
+    for row in rows:
+        if page and size + len(row) > limit:
+            yield "".join(page)
+            page, size = [], 0
+        page.append(row)
+        size += len(row)
+    if page:
+        yield "".join(page)
+
+def render_pages(flights, now_ts):
+    pages = [f"{BOARD_INTRO}```\n{BOARD_HEADER}{body}```" for body in paginate(board_rows(flights, now_ts))]
+    return pages or [f"{BOARD_INTRO}```\n📋 No scheduled flights\n```"]
+
+async def load_board_pages(channel):
+    # pages posted before a restart come back as partial messages, with no
+    # hash so the first render edits them; one deleted in the meantime is
+    # sent again by publish_page
+    global board_pages_loaded
+
+    rows = await fetchall(BOARD_PAGE_IDS)
+    board_pages[:] = [[channel.get_partial_message(message_id), None] for _, message_id in rows]
+    board_pages_loaded = True
+
+async def publish_page(channel, index, embed):
+    # edit the page's own message if it changed, otherwise leave it alone
+    page_hash = hashlib.sha256(f"{embed.title}{embed.description}".encode()).hexdigest()
+    
+    if index < len(board_pages):
+        message, last_hash = board_pages[index]
+        if page_hash == last_hash:
+            BOARD_STATS["skipped"] += 1
+            return
+        try:
+            await message.edit(embed=embed)
+        except discord.NotFound:
+            message = await channel.send(embed=embed)
+            await execute(SAVE_BOARD_PAGE, (index, message.id))
+        board_pages[index] = [message, page_hash]
+    else:
+        message = await channel.send(embed=embed)
+        await execute(SAVE_BOARD_PAGE, (index, message.id))
+        board_pages.append([message, page_hash])
+    
+    BOARD_STATS["sent"] += 1
 
 async def send_departure_board(bot):
-    global departure_board_message_id
+    global next_board_transition
     
     try:
         channel = bot.get_channel(DEPARTURE_BOARD_CHANNEL)
         if not channel:
             return
         
+        if not board_pages_loaded:
+            await load_board_pages(channel)
+        
         now_utc = datetime.now(timezone.utc)
+        now_ts = now_utc.timestamp()
         
-        fc.execute("""
-            SELECT flight_code, route, aircraft, departure_time, departure_date 
-            FROM flights 
-            ORDER BY departure_date, departure_time
-        """)
-        flights = fc.fetchall()
-        
-        if not flights:
-            board_text = "```\n📋 No scheduled flights\n```"
-        else:
-            board_text = "```\n"
-            board_text += "FLIGHT    DEST         DATE/TIME         STATUS      PAX\n"
-            board_text += "=" * 65 + "\n"
-            
-            for flight_code, route, aircraft, dep_time, dep_date in flights:
-                if not dep_date:
-                    continue
-                    
-                dest = route.split("->")[1] if "->" in route else route
-                dest = dest[:12].ljust(12)
-                
-                bc.execute("SELECT COUNT(*) FROM bookings WHERE flight=?", (flight_code,))
-                pax_count = bc.fetchone()[0]
-                
+        flights = await fetchall(BOARD_FLIGHTS)
+        
+        transitions = [t for t in (next_transition(row[5], now_ts) for row in flights) if t]
+        next_board_transition = min(transitions) if transitions else None
+        
+        pages = render_pages(flights, now_ts)
+        
+        for index, description in enumerate(pages):
+            embed = BOARD_PAGE.render(
+                timestamp=now_utc,
+                title=BOARD_TITLE if index == 0 else f"{BOARD_TITLE} — Page {index + 1}",
+                body=description
+            )
+            await publish_page(channel, index, embed)
+        
+        # the schedule shrank, drop the pages that are no longer needed
+        if len(board_pages) > len(pages):
+            while len(board_pages) > len(pages):
+                message, _ = board_pages.pop()
                 try:
-                    dep_datetime = datetime.strptime(
-                        f"{dep_date} {dep_time}", 
-                        "%d/%m/%Y %H:%M"
-                    ).replace(tzinfo=timezone.utc)
-                    
-                    time_diff = (dep_datetime - now_utc).total_seconds() / 60
-                    
-                    if time_diff < -30:
-                        status = "DEPARTED"
-                    elif time_diff < 0:
-                        status = "DEPARTING"
-                    elif time_diff < 30:
-                        status = "BOARDING"
-                    elif time_diff < 120:
-                        status = "CHECK-IN"
-                    else:
-                        status = "SCHEDULED"
-                    
-                    date_time_str = f"{dep_date} {dep_time}"
-                    
-                except:
-                    date_time_str = f"{dep_date} {dep_time}"
-                    status = "SCHEDULED"
-                
-                pax_str = f"{pax_count}/15"
-                board_text += f"{flight_code:<9} {dest} {date_time_str:<17} {status:<11} {pax_str}\n"
-            
-            board_text += "```"
-        
-        embed = discord.Embed(
-            title="🛫 AIR NEW ZEALAND DEPARTURES",
-            description=f"**✈️ LIVE DEPARTURE BOARD**\n{board_text}",
-            color=discord.Color.blue(),
-            timestamp=now_utc
-        )
-        embed.set_footer(text="All times UTC • Updates every 5 min")
-        
-        if departure_board_message_id:
-            try:
-                message = await channel.fetch_message(departure_board_message_id)
-                await message.edit(embed=embed)
-            except discord.NotFound:
-                msg = await channel.send(embed=embed)
-                departure_board_message_id = msg.id
-        else:
-            msg = await channel.send(embed=embed)
-            departure_board_message_id = msg.id
+                    await message.delete()
+                except discord.NotFound:
+                    pass
+            await execute(DROP_BOARD_PAGES, (len(pages),))
         
     except Exception as e:
         print(f"[DEPARTURE BOARD ERROR] {e}")
 
-@tasks.loop(minutes=2)
-async def update_departure_board(bot):
-    await send_departure_board(bot)
-
-@update_departure_board.before_loop
-async def before_update(bot):
+async def board_publisher(bot):
+    # wakes on a change notification or at the next status transition
     await bot.wait_until_ready()
+    last_sent = 0
+    
+    while True:
+        timeout = BOARD_MAX_IDLE
+        if next_board_transition is not None:
+            timeout = min(timeout, max(0, next_board_transition - time.time()))
+        
+        try:
+            await asyncio.wait_for(board_dirty.wait(), timeout)
+            await asyncio.sleep(BOARD_DEBOUNCE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        
+        wait = last_sent + BOARD_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        
+        board_dirty.clear()
+        await send_departure_board(bot)
+        last_sent = time.monotonic()
 
 @tasks.loop(minutes=10)
 async def cleanup_departed_flights():
     try:
-        now_utc = datetime.now(timezone.utc)
+        now_ts = int(datetime.now(timezone.utc).timestamp())
+        cutoff = now_ts - 7200  # 2 hours
+        
+        removed = await transaction(_remove_departed, cutoff, now_ts)
         
-        fc.execute("SELECT flight_code, departure_date, departure_time FROM flights")
-        flights = fc.fetchall()
-        
-        deleted_count = 0
-        for flight_code, dep_date, dep_time in flights:
-            if not dep_date:
-                continue
-                
-            try:
-                dep_dt = datetime.strptime(
-                    f"{dep_date} {dep_time}",
-                    "%d/%m/%Y %H:%M"
-                ).replace(tzinfo=timezone.utc)
-                
-                if (now_utc - dep_dt).total_seconds() > 7200:  # 2 hours
-                    with flights_lock:
-                        fc.execute("DELETE FROM flights WHERE flight_code=?", (flight_code,))
-                        flights_db.commit()
-                    
-                    if flight_code in FLIGHTS:
-                        del FLIGHTS[flight_code]
-                    
-                    deleted_count += 1
-                    print(f"[CLEANUP] Deleted {flight_code}")
-                    
-            except:
-                continue
-        
-        if deleted_count > 0:
-            print(f"[CLEANUP] Removed {deleted_count} flights")
+        for flight_code in removed:
+            FLIGHTS.pop(flight_code, None)
+            print(f"[CLEANUP] Deleted {flight_code}")
+        
+        if removed:
+            print(f"[CLEANUP] Removed {len(removed)} flights")
+            request_board_update()
             
     except Exception as e:
         print(f"[CLEANUP ERROR] {e}")
 
 def start_departure_board(bot):
-    update_departure_board.start(bot)
-    send_departure_board(bot)
+    global board_task
+    
+    if board_task and not board_task.done():
+        return
+    board_dirty.set()
+    board_task = asyncio.create_task(board_publisher(bot))
 
 def cleanup_task(bot):
     cleanup_departed_flights.start()
\ No newline at end of file
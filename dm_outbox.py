@@ -0,0 +1,166 @@
+import discord
+import asyncio
+import io
+import json
+import time
+
+from async_db import execute, fetchall, fetchone
+from database import register_query
+from users import known_deleted, resolve_user
+
+DM_WORKERS = 3
+MAX_ATTEMPTS = 6
+BASE_BACKOFF = 5       # seconds, doubled per attempt
+MAX_BACKOFF = 3600
+FETCH_BATCH = 20
+
+DM_STATS = {"sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+
+outbox_wake = asyncio.Event()
+outbox_queue = None
+in_flight = set()
+paused_until = 0
+outbox_tasks = []
+
+OUTBOX_INSERT = register_query("""
+    INSERT INTO dm_outbox (user_id, payload, file_name, file_data, attempts, next_attempt, status, created_at)
+    VALUES (?, ?, ?, ?, 0, ?, 'pending', ?)
+""")
+OUTBOX_DUE = register_query("""
+    SELECT id, user_id, payload, file_name, file_data, attempts FROM dm_outbox
+    WHERE status='pending' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?
+""")
+OUTBOX_NEXT_DUE = register_query("SELECT MIN(next_attempt) FROM dm_outbox WHERE status='pending'")
+# stats only: counts every row, off the covering idx_dm_outbox_due
+OUTBOX_COUNTS = register_query("SELECT status, COUNT(*) FROM dm_outbox GROUP BY status", "dm_outbox")
+OUTBOX_FAIL = register_query("UPDATE dm_outbox SET status='failed', last_error=? WHERE id=?")
+OUTBOX_RETRY = register_query("UPDATE dm_outbox SET attempts=?, next_attempt=?, last_error=? WHERE id=?")
+OUTBOX_DELETE = register_query("DELETE FROM dm_outbox WHERE id=?")
+
+class RecipientGone(Exception):
+    pass
+
+def dm_row(user_id, embed=None, content=None, file_name=None, file_data=None):
+    # parameters for OUTBOX_INSERT, for callers queueing DMs in their own transaction
+    payload = json.dumps({
+        "content": content,
+        "embed": embed.to_dict() if embed else None,
+    })
+    return (user_id, payload, file_name, file_data, time.time(), time.time())
+
+def notify_outbox():
+    outbox_wake.set()
+
+async def enqueue_dm(user_id, embed=None, content=None, file_name=None, file_data=None):
+    # handlers only record the DM; the workers deliver it
+    await execute(OUTBOX_INSERT, dm_row(user_id, embed, content, file_name, file_data))
+    notify_outbox()
+
+async def deliver(bot, user_id, payload, file_name, file_data):
+    data = json.loads(payload)
+    user = await resolve_user(bot, user_id)
+    if user is None:
+        if known_deleted(user_id):
+            raise RecipientGone(f"user {user_id} no longer exists")
+        raise LookupError(f"could not resolve user {user_id}")
+
+    kwargs = {}
+    if data["content"]:
+        kwargs["content"] = data["content"]
+    if data["embed"]:
+        kwargs["embed"] = discord.Embed.from_dict(data["embed"])
+    if file_data is not None:
+        kwargs["file"] = discord.File(io.BytesIO(file_data), filename=file_name)
+
+    await user.send(**kwargs)
+
+async def outbox_worker(bot):
+    global paused_until
+
+    while True:
+        row_id, user_id, payload, file_name, file_data, attempts = await outbox_queue.get()
+
+        try:
+            # a 429 on any worker pauses them all
+            wait = paused_until - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            try:
+                await deliver(bot, user_id, payload, file_name, file_data)
+            except (discord.Forbidden, discord.NotFound, RecipientGone) as e:
+                # DMs closed or the user is gone, retrying will not help
+                await execute(OUTBOX_FAIL, (str(e), row_id))
+                DM_STATS["failed"] += 1
+                print(f"[DM OUTBOX] Giving up on {user_id}: {e}")
+                continue
+            except (discord.HTTPException, LookupError) as e:
+                if getattr(e, "status", None) == 429:
+                    # our send rate, not the recipient: back at Retry-After
+                    # without using up an attempt
+                    retry_after = float(e.response.headers.get("Retry-After", BASE_BACKOFF))
+                    paused_until = time.time() + retry_after
+                    DM_STATS["rate_limited"] += 1
+                    await execute(OUTBOX_RETRY, (attempts, paused_until, str(e), row_id))
+                    continue
+
+                delay = min(BASE_BACKOFF * 2 ** attempts, MAX_BACKOFF)
+                if attempts + 1 >= MAX_ATTEMPTS:
+                    await execute(OUTBOX_FAIL, (str(e), row_id))
+                    DM_STATS["failed"] += 1
+                    print(f"[DM OUTBOX] Giving up on {user_id} after {attempts + 1} attempts: {e}")
+                else:
+                    await execute(OUTBOX_RETRY, (attempts + 1, time.time() + delay, str(e), row_id))
+                    DM_STATS["retried"] += 1
+                continue
+
+            await execute(OUTBOX_DELETE, (row_id,))
+            DM_STATS["sent"] += 1
+
+        except Exception as e:
+            print(f"[DM OUTBOX ERROR] {e}")
+        finally:
+            in_flight.discard(row_id)
+            outbox_queue.task_done()
+            outbox_wake.set()
+
+async def outbox_dispatcher(bot):
+    # feeds due rows to the workers; pending rows survive restarts
+    await bot.wait_until_ready()
+
+    while True:
+        outbox_wake.clear()
+
+        try:
+            rows = await fetchall(OUTBOX_DUE, (time.time(), FETCH_BATCH))
+
+            for row in rows:
+                if row[0] not in in_flight:
+                    in_flight.add(row[0])
+                    await outbox_queue.put(row)
+
+            next_due = (await fetchone(OUTBOX_NEXT_DUE))[0]
+        except Exception as e:
+            print(f"[DM OUTBOX ERROR] {e}")
+            next_due = time.time() + BASE_BACKOFF
+
+        # due rows still with the workers wake us when they finish
+        timeout = None if next_due is None or next_due <= time.time() else next_due - time.time()
+        try:
+            await asyncio.wait_for(outbox_wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+async def outbox_stats():
+    counts = dict(await fetchall(OUTBOX_COUNTS))
+    return dict(DM_STATS, pending=counts.get("pending", 0), failed_total=counts.get("failed", 0))
+
+def start_dm_outbox(bot):
+    global outbox_queue
+
+    if outbox_tasks:
+        return
+    outbox_queue = asyncio.Queue(maxsize=DM_WORKERS * 2)
+    outbox_tasks.append(asyncio.create_task(outbox_dispatcher(bot)))
+    for _ in range(DM_WORKERS):
+        outbox_tasks.append(asyncio.create_task(outbox_worker(bot)))
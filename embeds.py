@@ -0,0 +1,172 @@
+import discord
+from string import Formatter
+from typing import NamedTuple
+
+
+class Field(NamedTuple):
+    name: str
+    value: str
+    inline: bool = False
+    optional: bool = False   # left out while any key it reads is None or empty
+
+
+def _keys(text):
+    # the names a format string reads, e.g. "**{balance:,}**" -> {"balance"}
+    keys = set()
+    for _, name, _, _ in Formatter().parse(text):
+        if name:
+            keys.add(name.split(".")[0].split("[")[0])
+    return keys
+
+
+class Part:
+    # one compiled format string; text without placeholders is rendered once
+    def __init__(self, text):
+        self.text = text
+        self.keys = _keys(text) if text else set()
+        self.static = text.format() if text and not self.keys else text
+
+    def render(self, values):
+        return self.text.format_map(values) if self.keys else self.static
+
+
+class Template:
+    # a declarative embed: title, description, footer and field values are
+    # format strings over the row being shown; color is a Color, an int or
+    # a function of the values
+    def __init__(self, title=None, description=None, color=None, fields=(),
+                 footer=None, image=None, timestamp=False):
+        self.spec = dict(title=title, description=description, color=color, fields=fields,
+                         footer=footer, image=image, timestamp=timestamp)
+        self.title = Part(title)
+        self.description = Part(description)
+        self.footer = Part(footer)
+        self.fields = [(field, Part(field.name), Part(field.value)) for field in fields]
+        self.color = color
+        self.image = image
+        self.timestamp = timestamp
+
+        parts = [self.title, self.description, self.footer] + [p for _, n, v in self.fields for p in (n, v)]
+        dynamic = any(p.keys for p in parts) or callable(color) or timestamp
+        # fully static embeds (the welcome banner) are built once; a timestamp
+        # counts as dynamic, so timestamped prompts are still built per send
+        self._cached = None if dynamic else self._build({}, None)
+
+    def variant(self, **changes):
+        return Template(**dict(self.spec, **changes))
+
+    def _color(self, values):
+        return self.color(values) if callable(self.color) else self.color
+
+    def _skip(self, field, value, values):
+        return field.optional and any(values.get(k) in (None, "") for k in value.keys)
+
+    def _build(self, values, timestamp):
+        embed = discord.Embed(
+            title=self.title.render(values),
+            description=self.description.render(values),
+            color=self._color(values),
+        )
+        for field, name, value in self.fields:
+            if not self._skip(field, value, values):
+                embed.add_field(name=name.render(values), value=value.render(values), inline=field.inline)
+        if self.footer.text:
+            embed.set_footer(text=self.footer.render(values))
+        if self.image:
+            embed.set_image(url=self.image)
+        if self.timestamp:
+            embed.timestamp = timestamp or discord.utils.utcnow()
+        return embed
+
+    def render(self, timestamp=None, **values):
+        if self._cached is not None:
+            return self._cached.copy()
+        return self._build(values, timestamp)
+
+    def update(self, embed, changed, timestamp=None, **values):
+        # re-renders only what reads the changed keys; every other field is
+        # reused from the posted embed as it stands
+        changed = set(changed)
+        posted = {f.name: f for f in embed.fields}
+        embed = embed.copy()
+
+        if self.title.keys & changed:
+            embed.title = self.title.render(values)
+        if self.description.keys & changed:
+            embed.description = self.description.render(values)
+        if callable(self.color):
+            embed.color = self._color(values)
+        if self.footer.text:
+            embed.set_footer(text=self.footer.render(values))
+
+        embed.clear_fields()
+        for field, name, value in self.fields:
+            old = posted.get(name.static) if not name.keys else None
+            if old is not None and not ((name.keys | value.keys) & changed):
+                embed.add_field(name=old.name, value=old.value, inline=field.inline)
+            elif not self._skip(field, value, values):
+                embed.add_field(name=name.render(values), value=value.render(values), inline=field.inline)
+
+        if self.timestamp:
+            embed.timestamp = timestamp or discord.utils.utcnow()
+        return embed
+
+
+# shared by the paginated list views
+LIST_PAGE = Template(
+    title="{title}",
+    description="{body}",
+    color=discord.Color.blue(),
+    footer="Page {page}",
+)
+
+
+class ListPager(discord.ui.View):
+    # keyset pages rendered with LIST_PAGE: fetch(key) returns up to
+    # page_size + 1 rows past key, and each row's first column is its key
+    def __init__(self, owner, title, header, fetch, line, page_size=10, empty="Nothing found",
+                 first="", labels=("◀ Previous", "Next ▶")):
+        super().__init__(timeout=300)
+        self.owner = owner
+        self.title = title
+        self.header = header
+        self.fetch = fetch
+        self.line = line
+        self.page_size = page_size
+        self.empty = empty
+        self.starts = [first]   # key each visited page starts past
+        self.rows = []
+        self.previous.label, self.next.label = labels
+
+    async def load(self):
+        rows = await self.fetch(self.starts[-1])
+        self.rows = rows[:self.page_size]
+        self.previous.disabled = len(self.starts) == 1
+        self.next.disabled = len(rows) <= self.page_size
+
+    def embed(self):
+        lines = [self.line(row) for row in self.rows] or [self.empty]
+        return LIST_PAGE.render(title=self.title, body=self.header + "\n".join(lines), page=len(self.starts))
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        # runs before either button touches the page stack
+        if interaction.user.id != self.owner:
+            await interaction.response.send_message("❌ Not your list", ephemeral=True)
+            return False
+        return True
+
+    async def show(self, interaction):
+        await self.load()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.starts) > 1:
+            self.starts.pop()
+        await self.show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.rows:
+            self.starts.append(self.rows[-1][0])
+        await self.show(interaction)
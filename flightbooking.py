@@ -1,27 +1,216 @@
 import discord
 from discord import app_commands
-import random
+import csv
+import heapq
+import io
 import string
 import re
-from datetime import datetime
+import tempfile
+from collections import Counter
 import sqlite3
+from threading import Lock
 
-from database import bc, bookings_db, booking_lock, FLIGHTS
+from database import CABIN_SEAT_COLUMNS, FLIGHTS, register_query
+from async_db import fetchall, on_rollback, query, transaction
+from departureboard import request_board_update
+from dm_outbox import enqueue_dm
+from embeds import Field, Template, ListPager
 
 BOT_COMMANDS_CHANNEL = 1468449739388227695
+STAFF_ROLES_IDS = {1468230337900580887}
 CABINS = ["Economy", "Premium Economy", "Business", "First Class"]
-
-def gen_code():
-    with booking_lock:
-        for _ in range(10):
-            code = "BK" + "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            try:
-                bc.execute("SELECT code FROM bookings WHERE code=?", (code,))
-                if not bc.fetchone():
-                    return code
-            except:
-                continue
-        raise Exception("Failed to generate code")
+WHO = ["Myself", "Other"]   # the two answers the booking flow offers
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+CODE_SPACE = len(CODE_ALPHABET) ** 6
+# coprime with CODE_SPACE, so n -> n * CODE_SCRAMBLE is a bijection and
+# consecutive sequence values still give random-looking codes
+CODE_SCRAMBLE = 1_000_000_007
+
+CLAIM_CODES = register_query(
+    "UPDATE code_sequence SET next_value = MAX(next_value, ?) + ? WHERE id = 1 RETURNING next_value"
+)
+TAKE_SEAT = register_query(
+    "UPDATE seat_inventory SET remaining = remaining - 1 WHERE flight=? AND cabin=? AND remaining > 0"
+)
+TAKE_SEATS = register_query(
+    "UPDATE seat_inventory SET remaining = remaining - ? WHERE flight=? AND cabin=? AND remaining >= ?"
+)
+# the inventory trigger carries a new capacity over to seat_inventory
+SET_CABIN_SEATS = {
+    cabin: register_query(f"UPDATE flights SET {column} = ? WHERE flight_code = ?")
+    for cabin, column in CABIN_SEAT_COLUMNS.items()
+}
+INSERT_BOOKING = register_query("INSERT INTO bookings VALUES (?,?,?,?,?,?,?,?,?,?)")
+TAKEN_CODES = register_query("SELECT code FROM bookings WHERE code IN ({marks})")
+EXPORT_BOOKINGS = register_query(
+    "SELECT code, flight, cabin, who, roblox, discord_id FROM bookings WHERE flight=? ORDER BY code"
+)
+
+def encode_code(n):
+    n = ((n + 1) * CODE_SCRAMBLE) % CODE_SPACE
+    chars = []
+    for _ in range(6):
+        n, i = divmod(n, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[i])
+    return "BK" + "".join(reversed(chars))
+
+class CodeAllocator:
+    # hands out codes from blocks reserved on the persisted code_sequence,
+    # so issuing a code needs no lookup and no per-code round-trip
+    def __init__(self, block=100):
+        self.block = block
+        self.next = 0
+        self.end = 0
+        self.lock = Lock()
+
+    def _claim(self, cur, count):
+        # MAX() keeps a claim from landing inside the block in use
+        cur.execute(CLAIM_CODES, (self.end, count))
+        return cur.fetchone()[0]
+
+    def _reserve(self, cur):
+        self.end = self._claim(cur, self.block)
+        self.next = self.end - self.block
+        # the reservation is part of the caller's savepoint; if that rolls
+        # back, code_sequence does too and the block must not be handed out
+        on_rollback(self._discard, self.end)
+
+    def _discard(self, end):
+        with self.lock:
+            if self.end == end:
+                self.next = self.end = 0
+
+    def allocate(self, cur):
+        with self.lock:
+            if self.next >= self.end:
+                self._reserve(cur)
+            n = self.next
+            self.next += 1
+        return encode_code(n)
+
+    def allocate_many(self, cur, count):
+        # one reservation for a whole import, past the block in use
+        with self.lock:
+            end = self._claim(cur, count)
+        return [encode_code(n) for n in range(end - count, end)]
+
+codes = CodeAllocator()
+
+def _insert_booking(cur, flight, route, aircraft, time, cabin, who, roblox, did, booker):
+    # the capacity check and the decrement are one statement; if the insert
+    # below fails the savepoint puts the seat back
+    cur.execute(TAKE_SEAT, (flight, cabin))
+    if cur.rowcount == 0:
+        return None
+
+    for _ in range(10):
+        code = codes.allocate(cur)
+        try:
+            cur.execute(
+                INSERT_BOOKING,
+                (code, flight, route, aircraft, time, cabin, who, roblox, did, booker)
+            )
+            return code
+        except sqlite3.IntegrityError:
+            # only codes issued randomly before the sequence existed can clash
+            continue
+    raise Exception("Failed to allocate booking code")
+
+class SeatsUnavailable(Exception):
+    pass
+
+def _set_capacity(cur, flight, cabin, seats):
+    try:
+        cur.execute(SET_CABIN_SEATS[cabin], (seats, flight))
+    except sqlite3.IntegrityError:
+        raise SeatsUnavailable(f"{flight} already has more than {seats} {cabin} bookings")
+    return cur.rowcount
+
+IMPORT_MAX_ROWS = 2000
+CSV_FIELDS = ["code", "flight", "cabin", "who", "roblox", "discord_id"]
+EXPORT_SPOOL_BYTES = 1024 * 1024   # larger exports spill to a temp file
+
+def _taken_codes(cur, candidates):
+    taken = set()
+    for i in range(0, len(candidates), 500):
+        chunk = candidates[i:i + 500]
+        cur.execute(TAKEN_CODES.format(marks=",".join("?" * len(chunk))), chunk)
+        taken.update(row[0] for row in cur)
+    return taken
+
+def _import_bookings(cur, rows, booker):
+    # rows are (flight, cabin, who, roblox, did); all or nothing, raising
+    # rolls the seats and the code reservation back with the savepoint
+    needed = Counter((flight, cabin) for flight, cabin, *_ in rows)
+    for (flight, cabin), count in needed.items():
+        cur.execute(TAKE_SEATS, (count, flight, cabin, count))
+        if cur.rowcount == 0:
+            raise SeatsUnavailable(f"not enough {cabin} seats left on {flight} for {count} passengers")
+
+    new_codes = codes.allocate_many(cur, len(rows))
+    # only codes issued randomly before the sequence existed can clash
+    taken = _taken_codes(cur, new_codes)
+    while taken:
+        replaced = [codes.allocate(cur) if code in taken else code for code in new_codes]
+        taken = _taken_codes(cur, [c for c, old in zip(replaced, new_codes) if c != old])
+        new_codes = replaced
+
+    bookings = []
+    for code, (flight, cabin, who, roblox, did) in zip(new_codes, rows):
+        route, aircraft, time = FLIGHTS[flight]
+        bookings.append((code, flight, route, aircraft, time, cabin, who, roblox, did, booker))
+    cur.executemany(INSERT_BOOKING, bookings)
+    return new_codes
+
+def parse_import(data):
+    # returns (rows, errors); line numbers count the header as line 1
+    rows, errors = [], []
+    try:
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    except UnicodeDecodeError:
+        return [], ["file is not UTF-8 text"]
+
+    missing = {"flight", "cabin", "roblox", "discord_id"} - set(reader.fieldnames or ())
+    if missing:
+        return [], [f"missing columns: {', '.join(sorted(missing))}"]
+
+    for line, row in enumerate(reader, start=2):
+        flight = (row["flight"] or "").strip()
+        cabin = (row["cabin"] or "").strip()
+        roblox = (row["roblox"] or "").strip()
+        did = (row["discord_id"] or "").strip()
+        who = (row.get("who") or "").strip() or "Other"
+
+        if flight not in FLIGHTS:
+            errors.append(f"line {line}: unknown flight {flight!r}")
+        elif cabin not in CABINS:
+            errors.append(f"line {line}: unknown cabin {cabin!r}")
+        elif who not in WHO:
+            errors.append(f"line {line}: who must be {' or '.join(WHO)}, not {who!r}")
+        elif not valid_roblox(roblox):
+            errors.append(f"line {line}: invalid Roblox username {roblox!r}")
+        elif not valid_did(did):
+            errors.append(f"line {line}: invalid Discord ID {did!r}")
+        else:
+            rows.append((flight, cabin, who, roblox, did))
+
+        if len(rows) + len(errors) > IMPORT_MAX_ROWS:
+            return [], [f"more than {IMPORT_MAX_ROWS} rows"]
+    return rows, errors
+
+def _export_bookings(cur, flight):
+    # rows stream from the cursor into a spooled file, never a full list
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(CSV_FIELDS)
+    for row in cur.execute(EXPORT_BOOKINGS, (flight,)):
+        writer.writerow(row)
+    text.flush()
+    text.detach()
+    out.seek(0)
+    return out
 
 def valid_roblox(x):
     return bool(re.fullmatch(r"[A-Za-z0-9_]{3,20}", x))
@@ -32,26 +221,55 @@ def valid_did(x):
 def is_bot_commands_channel(i):
     return i.channel_id == BOT_COMMANDS_CHANNEL
 
-class FlightView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=300)
-
-        options = [
-            discord.SelectOption(label=f"{k} | {v[0]} | {v[1]} | {v[2]}")
-            for k, v in FLIGHTS.items()
-        ]
-
-        select = discord.ui.Select(placeholder="Choose flight", options=options)
-        select.callback = self.select_callback
-        self.add_item(select)
-
-    async def select_callback(self, interaction: discord.Interaction):
-        flight = interaction.data["values"][0].split(" | ")[0]
-        await interaction.response.send_message(
-            "Who is this booking for?",
-            view=WhoView(flight),
-            ephemeral=True
-        )
+def staff(i):
+    return any(r.id in STAFF_ROLES_IDS for r in i.user.roles)
+
+PAGE_SIZE = 10
+
+BOOKING_CONFIRMED = Template(
+    title="✈️ Booking Confirmed",
+    color=discord.Color.green(),
+    fields=[
+        Field("Flight", "**{flight}**"),
+        Field("Route", "{route}"),
+        Field("Aircraft", "{aircraft}"),
+        Field("Departure Time", "{time}"),
+        Field("Cabin Class", "**{cabin}**"),
+        Field("Booking Code", "**{code}**"),
+        Field("Booked For", "{roblox}", inline=True),
+    ],
+    footer="Thank you for booking!",
+    timestamp=True,
+)
+BOOKING_CONFIRMED_DM = BOOKING_CONFIRMED.variant(title="✈️ Your Booking is Confirmed!")
+
+# keyset pages: each reads PAGE_SIZE + 1 rows after the last code shown,
+# straight off a covering index, so deep pages cost the same as the first
+MY_BOOKINGS_BY_BOOKER = register_query("""
+    SELECT code, flight, route, time, cabin, roblox FROM bookings
+    WHERE booked_by=? AND code > ? ORDER BY code LIMIT ?
+""")
+MY_BOOKINGS_BY_PASSENGER = register_query("""
+    SELECT code, flight, route, time, cabin, roblox FROM bookings
+    WHERE discord_id=? AND code > ? ORDER BY code LIMIT ?
+""")
+MANIFEST_PAGE = register_query("""
+    SELECT code, cabin, who, roblox, discord_id FROM bookings
+    WHERE flight=? AND code > ? ORDER BY code LIMIT ?
+""")
+
+def _my_bookings(cur, user_id, after):
+    # bookings you made plus bookings made for you; two index range reads
+    # merged here, since an OR would fall back to a sort
+    pages = [
+        cur.execute(MY_BOOKINGS_BY_BOOKER, (user_id, after, PAGE_SIZE + 1)).fetchall(),
+        cur.execute(MY_BOOKINGS_BY_PASSENGER, (str(user_id), after, PAGE_SIZE + 1)).fetchall(),
+    ]
+    rows = []
+    for row in heapq.merge(*pages):
+        if not rows or rows[-1][0] != row[0]:
+            rows.append(row)
+    return rows[:PAGE_SIZE + 1]
 
 class WhoView(discord.ui.View):
     def __init__(self, flight):
@@ -131,50 +349,186 @@ class CabinButton(discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
 
         try:
-            code = gen_code()
             route, aircraft, time = FLIGHTS[self.p.flight]
 
-            with booking_lock:
-                bc.execute(
-                    "INSERT INTO bookings VALUES (?,?,?,?,?,?,?,?,?,?)",
-                    (code, self.p.flight, route, aircraft, time, self.cabin,
-                    self.p.who, self.p.roblox, self.p.did, self.p.booker)
-                )
-                bookings_db.commit()
+            code = await transaction(
+                _insert_booking,
+                self.p.flight, route, aircraft, time, self.cabin,
+                self.p.who, self.p.roblox, self.p.did, self.p.booker
+            )
         except sqlite3.IntegrityError:
             return await interaction.followup.send("❌ Code collision. Try again", ephemeral=True)
         except Exception as e:
             print(f"[BOOKING ERROR] {e}")
             return await interaction.followup.send("❌ Database error", ephemeral=True)
 
-        embed = discord.Embed(title="✈️ Booking Confirmed", color=discord.Color.green(), timestamp=datetime.now())
-        embed.add_field(name="Flight", value=f"**{self.p.flight}**", inline=False)
-        embed.add_field(name="Route", value=route, inline=False)
-        embed.add_field(name="Aircraft", value=aircraft, inline=False)
-        embed.add_field(name="Departure Time", value=time, inline=False)
-        embed.add_field(name="Cabin Class", value=f"**{self.cabin}**", inline=False)
-        embed.add_field(name="Booking Code", value=f"**{code}**", inline=False)
-        embed.add_field(name="Booked For", value=self.p.roblox, inline=True)
-        embed.set_footer(text="Thank you for booking!")
+        if code is None:
+            return await interaction.followup.send(f"❌ {self.cabin} is full on this flight", ephemeral=True)
 
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        request_board_update()
 
-        
-        try:
-            from main import bot
-            user = await bot.fetch_user(self.p.booker)
-            dm_embed = embed.copy()
-            dm_embed.title = "✈️ Your Booking is Confirmed!"
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        booking = dict(
+            flight=self.p.flight, route=route, aircraft=aircraft, time=time,
+            cabin=self.cabin, code=code, roblox=self.p.roblox
+        )
+        await interaction.followup.send(embed=BOOKING_CONFIRMED.render(**booking), ephemeral=True)
+        await enqueue_dm(self.p.booker, embed=BOOKING_CONFIRMED_DM.render(**booking))
 
 def register_flight_commands(bot):
     @bot.tree.command(name="bookflight", description="Book a flight")
     @app_commands.check(is_bot_commands_channel)
-    async def bookflight(interaction: discord.Interaction):
-        await interaction.response.send_message("Select a flight:", view=FlightView(), ephemeral=True)
+    async def bookflight(interaction: discord.Interaction, flight: str):
+        if flight not in FLIGHTS:
+            return await interaction.response.send_message("❌ Unknown flight", ephemeral=True)
+
+        await interaction.response.send_message(
+            "Who is this booking for?",
+            view=WhoView(flight),
+            ephemeral=True
+        )
+
+    @bookflight.autocomplete("flight")
+    async def bookflight_autocomplete(interaction: discord.Interaction, current: str):
+        choices = []
+        for code in FLIGHTS.search(current):
+            route, aircraft, time = FLIGHTS[code]
+            choices.append(app_commands.Choice(name=f"{code} | {route} | {aircraft} | {time}"[:100], value=code))
+        return choices
 
     @bookflight.error
     async def bookflight_err(interaction: discord.Interaction, error):
-        await interaction.response.send_message("⚠️ Use bot commands channel only", ephemeral=True)
\ No newline at end of file
+        await interaction.response.send_message("⚠️ Use bot commands channel only", ephemeral=True)
+
+    @bot.tree.command(name="mybookings", description="List your bookings")
+    async def mybookings(interaction: discord.Interaction):
+        user_id = interaction.user.id
+
+        async def fetch(after):
+            return await query(_my_bookings, user_id, after)
+
+        def line(row):
+            code, flight, route, time, cabin, roblox = row
+            return f"**{code}** • {flight} {route} • {time} • {cabin} • {roblox}"
+
+        try:
+            pager = ListPager(user_id, "🎫 My Bookings", "", fetch, line, PAGE_SIZE, "No bookings found")
+            await pager.load()
+            await interaction.response.send_message(embed=pager.embed(), view=pager, ephemeral=True)
+        except Exception as e:
+            print(f"[BOOKINGS / LIST] {e}")
+            await interaction.response.send_message("❌ Error", ephemeral=True)
+
+    @bot.tree.command(name="manifest", description="Passenger manifest for a flight (Staff)")
+    @app_commands.check(staff)
+    async def manifest(interaction: discord.Interaction, flight: str):
+        async def fetch(after):
+            return await fetchall(MANIFEST_PAGE, (flight, after, PAGE_SIZE + 1))
+
+        def line(row):
+            code, cabin, who, roblox, did = row
+            return f"**{code}** • {cabin} • {roblox} (<@{did}>)"
+
+        header = ""
+        if flight in FLIGHTS:
+            route, aircraft, time = FLIGHTS[flight]
+            header = f"{route} • {aircraft} • {time}\n\n"
+
+        try:
+            pager = ListPager(
+                interaction.user.id, f"📋 Manifest {flight}", header, fetch, line, PAGE_SIZE, "No bookings found"
+            )
+            await pager.load()
+            await interaction.response.send_message(embed=pager.embed(), view=pager, ephemeral=True)
+        except Exception as e:
+            print(f"[BOOKINGS / MANIFEST] {e}")
+            await interaction.response.send_message("❌ Error", ephemeral=True)
+
+    @manifest.autocomplete("flight")
+    async def manifest_autocomplete(interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=code, value=code) for code in FLIGHTS.search(current)]
+
+    @manifest.error
+    async def manifest_err(interaction: discord.Interaction, error):
+        await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
+
+    @bot.tree.command(name="importbookings", description="Bulk import bookings from CSV (Staff)")
+    @app_commands.check(staff)
+    async def importbookings(interaction: discord.Interaction, file: discord.Attachment):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            rows, errors = parse_import(await file.read())
+            if errors:
+                shown = "\n".join(errors[:10])
+                more = f"\n…and {len(errors) - 10} more" if len(errors) > 10 else ""
+                return await interaction.followup.send(f"❌ Nothing imported:\n{shown}{more}", ephemeral=True)
+            if not rows:
+                return await interaction.followup.send("❌ No rows to import", ephemeral=True)
+
+            new_codes = await transaction(_import_bookings, rows, interaction.user.id)
+        except SeatsUnavailable as e:
+            return await interaction.followup.send(f"❌ Nothing imported: {e}", ephemeral=True)
+        except Exception as e:
+            print(f"[BOOKINGS / IMPORT] {e}")
+            return await interaction.followup.send("❌ Database error", ephemeral=True)
+
+        request_board_update()
+        flights = Counter(row[0] for row in rows)
+        summary = ", ".join(f"{flight} ({count})" for flight, count in sorted(flights.items()))
+        await interaction.followup.send(f"✅ Imported {len(new_codes)} bookings: {summary}", ephemeral=True)
+        print(f"[BOOKINGS] Imported {len(new_codes)} bookings by {interaction.user}")
+
+    @importbookings.error
+    async def importbookings_err(interaction: discord.Interaction, error):
+        await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
+
+    @bot.tree.command(name="setcapacity", description="Set a cabin's seat count on a flight (Staff)")
+    @app_commands.check(staff)
+    @app_commands.choices(cabin=[app_commands.Choice(name=cabin, value=cabin) for cabin in CABINS])
+    async def setcapacity(interaction: discord.Interaction, flight: str, cabin: app_commands.Choice[str],
+                          seats: app_commands.Range[int, 0, 10000]):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            if not await transaction(_set_capacity, flight, cabin.value, seats):
+                return await interaction.followup.send("❌ Unknown flight", ephemeral=True)
+        except SeatsUnavailable as e:
+            return await interaction.followup.send(f"❌ {e}", ephemeral=True)
+        except Exception as e:
+            print(f"[BOOKINGS / CAPACITY] {e}")
+            return await interaction.followup.send("❌ Database error", ephemeral=True)
+
+        request_board_update()
+        await interaction.followup.send(f"✅ {flight} {cabin.value}: {seats} seats", ephemeral=True)
+        print(f"[BOOKINGS] {flight} {cabin.value} capacity set to {seats} by {interaction.user}")
+
+    @setcapacity.autocomplete("flight")
+    async def setcapacity_autocomplete(interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=code, value=code) for code in FLIGHTS.search(current)]
+
+    @setcapacity.error
+    async def setcapacity_err(interaction: discord.Interaction, error):
+        await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
+
+    @bot.tree.command(name="exportbookings", description="Export a flight's bookings as CSV (Staff)")
+    @app_commands.check(staff)
+    async def exportbookings(interaction: discord.Interaction, flight: str):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            out = await query(_export_bookings, flight)
+            await interaction.followup.send(
+                file=discord.File(out, filename=f"{flight}_bookings.csv"),
+                ephemeral=True
+            )
+        except Exception as e:
+            print(f"[BOOKINGS / EXPORT] {e}")
+            await interaction.followup.send("❌ Error", ephemeral=True)
+
+    @exportbookings.autocomplete("flight")
+    async def exportbookings_autocomplete(interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=code, value=code) for code in FLIGHTS.search(current)]
+
+    @exportbookings.error
+    async def exportbookings_err(interaction: discord.Interaction, error):
+        await interaction.response.send_message("⚠️ Staff only", ephemeral=True)
\ No newline at end of file
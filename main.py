@@ -24,13 +24,30 @@ bot = commands.Bot(command_prefix="!", intents=intents)
 start_time = time.time()
 
 # import all the modules
-from database import setup_databases
+from async_db import setup as setup_databases, start_checkpoint_task, batch_stats
 from flight_booking import register_flight_commands
-from boarding import register_boarding_commands
-from airpoints import register_airpoints_commands
+from boarding import register_boarding_commands, load_announcements
+from airpoints import register_airpoints_commands, start_ledger_compaction, load_leaderboard, balance_stats
 from tickets import register_ticket_commands, setup_ticket_views
 from qotd import start_qotd_task
-from departure_board import start_departure_board, cleanup_task
+from departure_board import start_departure_board, cleanup_task, BOARD_STATS
+from dm_outbox import start_dm_outbox, outbox_stats
+from embeds import Template
+from users import user_stats
+
+WELCOME = Template(
+    title="Welcome to Air New Zealand!",
+    description="Kia Ora {mention}!\n\nWelcome to Air New Zealand | PTFS family!",
+    color=41370
+)
+
+# nothing in the banner changes, so it is built once and copied
+WELCOME_BANNER = Template(
+    title="New to Air New Zealand | PTFS?",
+    description=f"Looking for flights? Check out our departure board!\n\nChat with others in <#{GENERAL_CHANNEL_ID}>",
+    color=41370,
+    image=IMAGE_URL
+)
 
 def staff(i):
     return any(role.id in STAFF_ROLES_IDS for role in i.user.roles)
@@ -40,7 +57,9 @@ def is_bot_commands_channel(i):
 
 @bot.event
 async def on_ready():
-    setup_databases()
+    await setup_databases()
+    await load_leaderboard()
+    await load_announcements()
     setup_ticket_views(bot)
     
     # register all commands
@@ -53,6 +72,9 @@ async def on_ready():
     start_qotd_task(bot)
     start_departure_board(bot)
     cleanup_task(bot)
+    start_checkpoint_task()
+    start_dm_outbox(bot)
+    start_ledger_compaction()
     
     try:
         await bot.tree.sync()
@@ -67,22 +89,7 @@ async def on_member_join(member):
     if channel is None:
         return
 
-    general = f"<#{GENERAL_CHANNEL_ID}>"
-    
-    embed = discord.Embed(
-        title="Welcome to Air New Zealand!",
-        description=f"Kia Ora {member.mention}!\n\nWelcome to Air New Zealand | PTFS family!",
-        color=41370
-    )
-
-    embed2 = discord.Embed(
-        title="New to Air New Zealand | PTFS?",
-        description=f"Looking for flights? Check out our departure board!\n\nChat with others in {general}",
-        color=41370
-    )
-    embed2.set_image(url=IMAGE_URL)
-
-    await channel.send(member.mention, embeds=[embed, embed2])
+    await channel.send(member.mention, embeds=[WELCOME.render(mention=member.mention), WELCOME_BANNER.render()])
 
 @bot.command()
 async def stats(ctx):
@@ -102,6 +109,47 @@ async def stats(ctx):
     embed.add_field(name="📩 Message Latency", value=f"{msg_latency}ms", inline=True)
     embed.add_field(name="⏳ Uptime", value=uptime, inline=False)
 
+    db = batch_stats()
+    if db:
+        embed.add_field(
+            name="🗄️ DB Writes",
+            value=f"{db['writes']} writes in {db['batches']} batches "
+                  f"(avg {db['avg_size']:.1f}, max {db['max_size']})\n"
+                  f"commit avg {db['avg_commit_ms']:.1f}ms / max {db['max_commit_ms']:.1f}ms",
+            inline=False
+        )
+
+    embed.add_field(
+        name="🛫 Departure Board",
+        value=f"{BOARD_STATS['sent']} edits sent, {BOARD_STATS['skipped']} skipped (unchanged)",
+        inline=False
+    )
+
+    dm = await outbox_stats()
+    embed.add_field(
+        name="✉️ DM Outbox",
+        value=f"{dm['sent']} sent, {dm['retried']} retried, {dm['rate_limited']} rate limited\n"
+              f"{dm['pending']} pending, {dm['failed_total']} failed",
+        inline=False
+    )
+
+    balances = balance_stats()
+    embed.add_field(
+        name="💳 Balance Lookups",
+        value=f"{balances['hits']} found, {balances['misses']} with no record, "
+              f"{balances['members']} members",
+        inline=False
+    )
+
+    users = user_stats()
+    embed.add_field(
+        name="👤 User Lookups",
+        value=f"{users['hit_rate']:.0%} hit rate over {users['lookups']} lookups "
+              f"({users['gateway']} gateway, {users['cached']} cached)\n"
+              f"{users['fetched']} fetched in {users['batches']} batches, {users['size']} cached",
+        inline=False
+    )
+
     await message.edit(content=None, embed=embed)
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 import asyncio
 import pytz
 
+from embeds import Field, Template
+
 QOTD_CHANNEL = 1378322223965929643
 DISCUSSION_CHANNEL = 1378321677578014770
 
@@ -31,6 +33,17 @@ QOTD_QUESTIONS = [
     "If you could live in any fictional world?",
 ]
 
+QOTD_EMBED = Template(
+    title="📝 Question of the Day",
+    description="{question}",
+    color=discord.Color.purple(),
+    fields=[
+        Field("💬 Discuss", f"Share thoughts in <#{DISCUSSION_CHANNEL}>!"),
+    ],
+    footer="Daily QOTD",
+    timestamp=True,
+)
+
 qotd_task = None
 
 @tasks.loop(hours=24)
@@ -42,20 +55,7 @@ async def send_qotd(bot):
         
         question = random.choice(QOTD_QUESTIONS)
         
-        embed = discord.Embed(
-            title="📝 Question of the Day",
-            description=question,
-            color=discord.Color.purple(),
-            timestamp=datetime.now()
-        )
-        embed.add_field(
-            name="💬 Discuss",
-            value=f"Share thoughts in <#{DISCUSSION_CHANNEL}>!",
-            inline=False
-        )
-        embed.set_footer(text="Daily QOTD")
-        
-        await channel.send(content="<@&QOTD>", embed=embed)
+        await channel.send(content="<@&QOTD>", embed=QOTD_EMBED.render(question=question))
         print(f"[QOTD] Sent at 5PM GMT")
         
     except Exception as e:
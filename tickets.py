@@ -1,10 +1,11 @@
 import discord
 from discord import app_commands
 from datetime import datetime
-import tempfile
-import os
 
-from database import tc, tickets_db, tickets_lock
+from async_db import execute, fetchone
+from database import register_query
+from dm_outbox import enqueue_dm
+from embeds import Field, Template
 
 HELPDESK_CHANNEL = 1468889471675273247
 TICKETS_CATEGORY_ID = 1468889195471700038
@@ -12,6 +13,64 @@ STAFF_ROLES_IDS = {1468230337900580887}
 
 helpdesk_embed_sent = False
 
+COUNT_TICKETS = register_query("SELECT COUNT(*) FROM tickets WHERE category=?")
+INSERT_TICKET = register_query("""
+    INSERT INTO tickets (ticket_number, channel_id, user_id, category, title, created_at, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+""")
+TICKET_BY_CHANNEL = register_query("SELECT ticket_number, user_id FROM tickets WHERE channel_id=?")
+CLOSE_TICKET = register_query("UPDATE tickets SET status=?, transcript=? WHERE channel_id=?")
+
+TICKET_OPENED = Template(
+    title="🎫 Support Ticket #{ticket_number}",
+    description="Thank you! Our team will assist you shortly.",
+    color=discord.Color.blue(),
+    fields=[
+        Field("Category", "{category}", inline=True),
+        Field("Status", "🟢 Open", inline=True),
+        Field("User", "{user}", inline=True),
+        Field("Issue", "{issue}"),
+    ],
+    footer="Use buttons below to close ticket",
+    timestamp=True,
+)
+
+CLOSE_PROMPT = Template(
+    title="⚠️ Close Ticket?",
+    description="Are you sure? This cannot be undone.",
+    color=discord.Color.orange(),
+    timestamp=True,
+)
+
+TICKET_CLOSED = Template(
+    title="🎫 Ticket Closed: {ticket_number}",
+    description="Your ticket has been closed. See transcript attached.",
+    color=discord.Color.green(),
+    footer="Thank you!",
+    timestamp=True,
+)
+
+HELPDESK = Template(
+    title=" ANZ | SUPPORT SERVICE",
+    description="Welcome to Air New Zealand Support.\n\nSelect a category below.\n\nFor small questions, use #general-chat.",
+    color=discord.Color.blue(),
+    fields=[
+        Field("📋 Categories", "**Partnership Inquiry** - Want to partner?\n**General Support** - Have a question?\n**Flight Booking Issue** - Booking problems?"),
+    ],
+    footer="Thank you",
+    timestamp=True,
+)
+
+HELPDESK_RESEND = Template(
+    title=" ANZ | Support Service",
+    description="Welcome to Air New Zealand Support.\n\nSelect a category below.",
+    color=discord.Color.blue(),
+    fields=[
+        Field("📋 Categories", "**Partnership** / **Support** / **Booking Issue**"),
+    ],
+    timestamp=True,
+)
+
 class TicketCategoryView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
@@ -42,9 +101,7 @@ class TicketModal(discord.ui.Modal):
         try:
             guild = interaction.guild
             
-            with tickets_lock:
-                tc.execute("SELECT COUNT(*) FROM tickets WHERE category=?", (self.category,))
-                count = tc.fetchone()[0] + 1
+            count = (await fetchone(COUNT_TICKETS, (self.category,)))[0] + 1
             
             ticket_number = f"{self.prefix}-{count:03d}"
             
@@ -64,23 +121,12 @@ class TicketModal(discord.ui.Modal):
                 topic=f"Ticket: {ticket_number} | User: {interaction.user.mention} | Category: {self.category}"
             )
 
-            with tickets_lock:
-                tc.execute("""
-                    INSERT INTO tickets (ticket_number, channel_id, user_id, category, title, created_at, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (ticket_number, channel.id, interaction.user.id, self.category, self.title_input.value, datetime.now().isoformat(), 'open'))
-                tickets_db.commit()
-
-            embed = discord.Embed(
-                title=f"🎫 Support Ticket #{ticket_number}",
-                description="Thank you! Our team will assist you shortly.",
-                color=discord.Color.blue(), timestamp=datetime.now()
+            await execute(INSERT_TICKET, (ticket_number, channel.id, interaction.user.id, self.category, self.title_input.value, datetime.now().isoformat(), 'open'))
+
+            embed = TICKET_OPENED.render(
+                ticket_number=ticket_number, category=self.category,
+                user=interaction.user.mention, issue=self.title_input.value
             )
-            embed.add_field(name="Category", value=self.category, inline=True)
-            embed.add_field(name="Status", value="🟢 Open", inline=True)
-            embed.add_field(name="User", value=interaction.user.mention, inline=True)
-            embed.add_field(name="Issue", value=self.title_input.value, inline=False)
-            embed.set_footer(text="Use buttons below to close ticket")
 
             await channel.send(embed=embed, view=TicketActionView())
             await interaction.followup.send(f"✅ Ticket created! {channel.mention}", ephemeral=True)
@@ -95,13 +141,7 @@ class TicketActionView(discord.ui.View):
 
     @discord.ui.button(label="Close Ticket", style=discord.ButtonStyle.danger, custom_id="close_ticket")
     async def close_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = discord.Embed(
-            title="⚠️ Close Ticket?",
-            description="Are you sure? This cannot be undone.",
-            color=discord.Color.orange(), timestamp=datetime.now()
-        )
-        
-        await interaction.response.send_message(embed=embed, view=ConfirmCloseView(interaction.channel), ephemeral=True)
+        await interaction.response.send_message(embed=CLOSE_PROMPT.render(), view=ConfirmCloseView(interaction.channel), ephemeral=True)
 
 class ConfirmCloseView(discord.ui.View):
     def __init__(self, channel):
@@ -113,10 +153,7 @@ class ConfirmCloseView(discord.ui.View):
         await interaction.response.defer(ephemeral=True)
 
         try:
-            from main import bot
-            
-            tc.execute("SELECT ticket_number, user_id FROM tickets WHERE channel_id=?", (self.channel.id,))
-            ticket_row = tc.fetchone()
+            ticket_row = await fetchone(TICKET_BY_CHANNEL, (self.channel.id,))
             
             if not ticket_row:
                 return await interaction.followup.send("❌ Ticket not found", ephemeral=True)
@@ -141,35 +178,13 @@ class ConfirmCloseView(discord.ui.View):
             except:
                 pass
 
-            with tickets_lock:
-                tc.execute("UPDATE tickets SET status=?, transcript=? WHERE channel_id=?",
-                    ('closed', transcript_text, self.channel.id))
-                tickets_db.commit()
+            await execute(CLOSE_TICKET, ('closed', transcript_text, self.channel.id))
 
             # send transcript to user
-            try:
-                user = await bot.fetch_user(user_id)
-                
-                transcript_filename = f"{ticket_number}_transcript.txt"
-                with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as tmp:
-                    tmp.write(transcript_text)
-                    tmp_path = tmp.name
-                
-                with open(tmp_path, 'rb') as f:
-                    transcript_file = discord.File(f, filename=transcript_filename)
-                    
-                    embed = discord.Embed(
-                        title=f"🎫 Ticket Closed: {ticket_number}",
-                        description="Your ticket has been closed. See transcript attached.",
-                        color=discord.Color.green(), timestamp=datetime.now()
-                    )
-                    embed.set_footer(text="Thank you!")
-                    
-                    await user.send(embed=embed, file=transcript_file)
-                
-                os.remove(tmp_path)
-            except:
-                print(f"[TRANSCRIPT] Could not DM user {user_id}")
+            await enqueue_dm(
+                user_id, embed=TICKET_CLOSED.render(ticket_number=ticket_number),
+                file_name=f"{ticket_number}_transcript.txt", file_data=transcript_text.encode()
+            )
 
             await interaction.followup.send(f"✅ Ticket {ticket_number} closed", ephemeral=True)
             await self.channel.delete(reason=f"Ticket {ticket_number} closed")
@@ -200,19 +215,7 @@ async def send_helpdesk_message(bot):
                     helpdesk_embed_sent = True
                     return
         
-        embed = discord.Embed(
-            title=" ANZ | SUPPORT SERVICE",
-            description="Welcome to Air New Zealand Support.\n\nSelect a category below.\n\nFor small questions, use #general-chat.",
-            color=discord.Color.blue(), timestamp=datetime.now()
-        )
-        embed.add_field(
-            name="📋 Categories",
-            value="**Partnership Inquiry** - Want to partner?\n**General Support** - Have a question?\n**Flight Booking Issue** - Booking problems?",
-            inline=False
-        )
-        embed.set_footer(text="Thank you")
-        
-        await channel.send(embed=embed, view=TicketCategoryView())
+        await channel.send(embed=HELPDESK.render(), view=TicketCategoryView())
         helpdesk_embed_sent = True
         print("[HELPDESK] Message sent")
         
@@ -235,18 +238,7 @@ def register_ticket_commands(bot):
             if not channel:
                 return await interaction.response.send_message("❌ Channel not found", ephemeral=True)
             
-            embed = discord.Embed(
-                title=" ANZ | Support Service",
-                description="Welcome to Air New Zealand Support.\n\nSelect a category below.",
-                color=discord.Color.blue(), timestamp=datetime.now()
-            )
-            embed.add_field(
-                name="📋 Categories",
-                value="**Partnership** / **Support** / **Booking Issue**",
-                inline=False
-            )
-            
-            await channel.send(embed=embed, view=TicketCategoryView())
+            await channel.send(embed=HELPDESK_RESEND.render(), view=TicketCategoryView())
             await interaction.response.send_message("✅ Sent!", ephemeral=True)
             
         except Exception as e:
@@ -0,0 +1,136 @@
+import discord
+import asyncio
+import time
+from collections import OrderedDict
+
+USER_CACHE_SIZE = 2000
+USER_CACHE_TTL = 3600        # seconds before a cached user is looked up again
+FETCH_BATCH_WINDOW = 0.05    # misses arriving within this window share one lookup
+FETCH_CONCURRENCY = 5        # parallel REST fetches for users outside the guilds
+QUERY_CHUNK = 100            # gateway member queries take at most 100 ids
+
+USER_STATS = {"gateway": 0, "cached": 0, "misses": 0, "fetched": 0, "batches": 0}
+
+# user_id -> (user or None, expires); None remembers a deleted account
+user_cache = OrderedDict()
+pending = {}
+fetch_queue = []
+flush_task = None
+
+def _remember(user_id, user):
+    user_cache[user_id] = (user, time.monotonic() + USER_CACHE_TTL)
+    user_cache.move_to_end(user_id)
+    while len(user_cache) > USER_CACHE_SIZE:
+        user_cache.popitem(last=False)
+
+async def _fetch_many(bot, user_ids):
+    found, gone = {}, set()
+    remaining = list(user_ids)
+
+    # one gateway request resolves up to 100 guild members
+    for guild in bot.guilds:
+        if not remaining:
+            break
+        for i in range(0, len(remaining), QUERY_CHUNK):
+            chunk = remaining[i:i + QUERY_CHUNK]
+            try:
+                members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            except Exception as e:
+                print(f"[USERS] Member query failed in {guild.id}: {e}")
+                continue
+            for member in members:
+                found[member.id] = member
+        remaining = [uid for uid in remaining if uid not in found]
+
+    # whoever is left is not in any of our guilds
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def fetch_one(user_id):
+        async with sem:
+            try:
+                found[user_id] = await bot.fetch_user(user_id)
+            except discord.NotFound:
+                gone.add(user_id)
+            except discord.HTTPException as e:
+                print(f"[USERS] Fetch failed for {user_id}: {e}")
+
+    await asyncio.gather(*(fetch_one(uid) for uid in remaining))
+    return found, gone
+
+async def _flush(bot):
+    while fetch_queue:
+        await asyncio.sleep(FETCH_BATCH_WINDOW)
+        user_ids = fetch_queue[:]
+        fetch_queue.clear()
+
+        USER_STATS["batches"] += 1
+        try:
+            found, gone = await _fetch_many(bot, user_ids)
+        except Exception as e:
+            print(f"[USERS ERROR] {e}")
+            found, gone = {}, set()
+
+        USER_STATS["fetched"] += len(found)
+        for user_id in user_ids:
+            user = found.get(user_id)
+            # transient failures are not cached, the next lookup retries
+            if user is not None or user_id in gone:
+                _remember(user_id, user)
+            future = pending.pop(user_id, None)
+            if future and not future.done():
+                future.set_result(user)
+
+async def resolve_users(bot, user_ids):
+    # gateway cache, then the LRU, then one batched fetch for the rest
+    global flush_task
+
+    loop = asyncio.get_running_loop()
+    now = time.monotonic()
+    resolved, waiting = {}, {}
+
+    for user_id in dict.fromkeys(user_ids):
+        user = bot.get_user(user_id)
+        if user is not None:
+            USER_STATS["gateway"] += 1
+            resolved[user_id] = user
+            continue
+
+        entry = user_cache.get(user_id)
+        if entry and entry[1] > now:
+            USER_STATS["cached"] += 1
+            user_cache.move_to_end(user_id)
+            resolved[user_id] = entry[0]
+            continue
+
+        USER_STATS["misses"] += 1
+        # concurrent lookups of the same user share one fetch
+        future = pending.get(user_id)
+        if future is None:
+            future = pending[user_id] = loop.create_future()
+            fetch_queue.append(user_id)
+        waiting[user_id] = future
+
+    if fetch_queue and (flush_task is None or flush_task.done()):
+        flush_task = asyncio.create_task(_flush(bot))
+
+    for user_id, future in waiting.items():
+        resolved[user_id] = await future
+    return resolved
+
+async def resolve_user(bot, user_id):
+    return (await resolve_users(bot, [user_id]))[user_id]
+
+def known_deleted(user_id):
+    # a lookup found the account gone, as opposed to one that failed
+    entry = user_cache.get(user_id)
+    return entry is not None and entry[0] is None
+
+def user_stats():
+    lookups = USER_STATS["gateway"] + USER_STATS["cached"] + USER_STATS["misses"]
+    hits = USER_STATS["gateway"] + USER_STATS["cached"]
+    return dict(
+        USER_STATS,
+        lookups=lookups,
+        hit_rate=hits / lookups if lookups else 0.0,
+        size=len(user_cache),
+    )